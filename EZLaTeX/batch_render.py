@@ -0,0 +1,115 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from compiler import ENGINES, CompileService, PreambleFormat, build_document
+from groups import build_groups, fit_estimated
+from latex import picture_latex
+from serializer import EXTENSION, load_records
+
+# Headless counterpart of the editor's Export PDF: turns saved .eztex (and older .json) documents
+# into PDFs without creating a Tk window.
+#
+#     python batch_render.py worksheets/ -o pdfs/ -j 8
+#     python batch_render.py "worksheets/**/*.eztex"
+#     python batch_render.py worksheets/ --engine stub   (no TeX needed)
+
+def load_groups(path):
+    # Without Tk there are no font metrics: blocks from files that stored no
+    # size are estimated, then fitted to the neighbours they were snapped to.
+    records = load_records(path, sized=False)
+    estimated = [r for r in records if not (r.w and r.h)]
+    for r in estimated:
+        r.estimate_size()
+    fit_estimated(records, estimated)
+    return build_groups(records)
+
+
+def render(path, out_path, engine, timeout):
+    # Runs in a worker process; CompileService gives the job its own scratch directory.
+    start = time.perf_counter()
+    tex = build_document(picture_latex(load_groups(path)))
+    result = CompileService(ENGINES[engine](), max_workers=1, timeout=timeout).compile(tex)
+    with open(out_path, "wb") as f:
+        f.write(result.pdf)
+    return time.perf_counter() - start
+
+
+def find_documents(patterns):
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.extend(sorted(glob.glob(os.path.join(pattern, "*" + EXTENSION))
+                                + glob.glob(os.path.join(pattern, "*.json"))))
+        else:
+            paths.extend(sorted(glob.glob(pattern, recursive=True)) or [pattern])
+    return list(dict.fromkeys(paths))
+
+
+def output_paths(documents, output=None):
+    # Under -o, the directory layout below the documents' common parent is
+    # mirrored, so a recursive glob cannot map two documents to one PDF. Paths
+    # that still clash (doc.eztex next to an old doc.json) are returned apart.
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in documents]) if output else None
+    targets, clashes = {}, []
+    for path in documents:
+        stem = os.path.splitext(os.path.basename(path))[0] + ".pdf"
+        if output:
+            relative = os.path.relpath(os.path.dirname(os.path.abspath(path)), root)
+            out_path = os.path.normpath(os.path.join(output, relative, stem))
+        else:
+            out_path = os.path.join(os.path.dirname(path), stem)
+        key = os.path.normcase(os.path.abspath(out_path))
+        if key in targets:
+            clashes.append((path, targets[key][0], out_path))
+        else:
+            targets[key] = (path, out_path)
+    return list(targets.values()), clashes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render EzTeX documents to PDF without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="documents, directories or glob patterns")
+    parser.add_argument("-o", "--output", help="directory for the PDFs (default: next to each document)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="parallel compiles")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds before a compile is killed")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="pdflatex")
+    args = parser.parse_args(argv)
+
+    documents = find_documents(args.inputs)
+    if not documents:
+        print("No documents found.", file=sys.stderr)
+        return 1
+    targets, clashes = output_paths(documents, args.output)
+    for _, out_path in targets:
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    if args.engine == "pdflatex":
+        # Build the preamble format once up front instead of in every worker.
+        PreambleFormat().path(args.timeout)
+
+    failures = len(clashes)
+    for path, other, out_path in clashes:
+        print(f"FAIL {path}: {out_path} is already the output of {other}")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        jobs = {}
+        for path, out_path in targets:
+            jobs[pool.submit(render, path, out_path, args.engine, args.timeout)] = (path, out_path)
+        for future in as_completed(jobs):
+            path, out_path = jobs[future]
+            try:
+                seconds = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"FAIL {path}: {e}")
+            else:
+                print(f"ok   {seconds * 1000:8.1f} ms  {path} -> {out_path}")
+    print(f"{len(documents) - failures}/{len(documents)} rendered in {time.perf_counter() - start:.2f} s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
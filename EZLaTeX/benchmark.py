@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from compiler import CompileService, PdflatexEngine, PreambleFormat, StubEngine, build_document
+from editor import BLOCK_VIEWS, LaTeXEditor
+from groups import GroupTracker, SNAP_DISTANCE, VERTICAL_THRESHOLD
+from history import UndoHistory
+from latex import PictureCache
+from native_render import ApproxMetrics, group_box
+from model import ExponentRecord, FractionRecord, NthRootRecord, OperationRecord
+from raster import rasterize
+from serializer import load_records, save_records
+from spatial import SpatialGrid, find_snap
+from blocks import base as block_base
+
+# Times the editor's hot paths on synthetic documents, without a display:
+#
+#     python benchmark.py                          10..10000 blocks, stub compiles
+#     python benchmark.py --sizes 1000 -o new.json --compare old.json
+#     python benchmark.py --engine pdflatex        real compiles and rasterization
+#
+# Results are JSON (one entry per benchmark and size, with median and min
+# seconds over --repeat runs), so runs from different commits can be diffed.
+
+SIZES = [10, 100, 1000, 10000]
+OPERATIONS = ["+", "-", "x", "/", "=", "∑", "∏", "∫", "(", ")", "log", "ln"]
+
+
+class NullJournal:
+    # The editor methods below report every change to the journal; its
+    # bookkeeping (and lock file) is not what these benchmarks time.
+    def touch(self, block):
+        pass
+
+    def removed(self, block):
+        pass
+
+
+class HeadlessEditor:
+    # The document side of LaTeXEditor with no Tk root: the methods below are
+    # the editor's own, run against blocks that never materialize a widget.
+    place_block = LaTeXEditor.place_block
+    get_groups = LaTeXEditor.get_groups
+    gather_pages = LaTeXEditor.gather_pages
+    gather_latex = LaTeXEditor.gather_latex
+    find_free_position = LaTeXEditor.find_free_position
+    propagate_font_size = LaTeXEditor.propagate_font_size
+    reposition_group = LaTeXEditor.reposition_group
+
+    def __init__(self):
+        self.blocks = []
+        self.spatial_index = SpatialGrid(block_base.SNAP_DISTANCE, block_base.VERTICAL_THRESHOLD)
+        self.group_tracker = GroupTracker(self.spatial_index, SNAP_DISTANCE, VERTICAL_THRESHOLD)
+        self.picture_cache = PictureCache()
+        self.gathered = (None, None)
+        self.revision = 0
+        self.history = UndoHistory()
+        self.journal = NullJournal()
+        self.canvas_width, self.canvas_height = 800, float("inf")
+
+    def mark_changed(self):
+        self.revision += 1
+
+    def update_group_borders(self):
+        pass
+
+    def load(self, records):
+        for record in records:
+            b = BLOCK_VIEWS[record.kind](None, record=record, materialize=False)
+            self.blocks.append(b)
+            self.place_block(b, record.x, record.y)
+
+
+def synthetic_records(count, seed=0):
+    # Rows of snapped groups (2-6 blocks edge to edge) mixing every block type.
+    rng = random.Random(seed)
+    makers = [lambda i: ExponentRecord(f"x_{i}", str(i % 9 + 1)),
+              lambda i: FractionRecord(str(i), str(i + 1)),
+              lambda i: NthRootRecord(f"y_{i}", str(i % 5 + 2)),
+              lambda i: OperationRecord(OPERATIONS[i % len(OPERATIONS)], log_argument=f"z_{i}" if i % 3 else "")]
+    records = []
+    x, y = 20, 20
+    while len(records) < count:
+        font_size = rng.choice(block_base.STANDARD_FONT_SIZES[:6])
+        for _ in range(min(rng.randint(2, 6), count - len(records))):
+            r = rng.choice(makers)(len(records))
+            r.font_size = font_size
+            r.estimate_size()
+            if x + r.w > 780:
+                x, y = 20, y + 40
+            r.x, r.y = x, y
+            x += r.w
+            records.append(r)
+        x += 40
+    return records
+
+
+def timed(fn, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        fn(state)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), min(times)
+
+
+def document(size):
+    editor = HeadlessEditor()
+    editor.load(synthetic_records(size))
+    return editor
+
+
+def run_size(size, repeat, engine, workdir):
+    results = []
+
+    def record(name, fn, setup=None, ops=1):
+        try:
+            median, best = timed(fn, repeat, setup)
+        except Exception as e:
+            # e.g. TeX or poppler missing; reported, not fatal.
+            results.append({"benchmark": name, "blocks": size, "error": str(e).splitlines()[0]})
+            return
+        results.append({"benchmark": name, "blocks": size, "ops": ops, "median_s": median, "min_s": best})
+
+    record("open_layout", lambda _: document(size))
+    editor = document(size)
+    rng = random.Random(1)
+    probes = [rng.choice(editor.blocks) for _ in range(200)]
+
+    def snap(_):
+        for b in probes:
+            find_snap(editor.spatial_index, b, b.x + 3, b.y + 2, b.w,
+                      block_base.SNAP_DISTANCE, block_base.VERTICAL_THRESHOLD)
+    record("snap", snap, ops=len(probes))
+
+    def drag(_):
+        for b in probes:
+            editor.place_block(b, b.x, b.y)
+    record("place_block", drag, ops=len(probes))
+
+    record("get_groups", lambda _: editor.get_groups())
+    metrics = ApproxMetrics()
+    record("native_layout", lambda _: [group_box(metrics, [b.record for b in g]) for g in editor.get_groups()])
+    record("find_free_position", lambda _: editor.find_free_position(20, 20, 40, 30))
+
+    record("gather_latex_cold", lambda ed: ed.gather_latex(), setup=lambda: document(size))
+    editor.gather_latex()
+
+    def gather_after_edit(_):
+        b = probes[0]
+        b.font_size = 10 if b.font_size != 10 else 12
+        editor.mark_changed()
+        editor.gather_latex()
+    record("gather_latex_edit", gather_after_edit)
+    record("gather_latex_unchanged", lambda _: editor.gather_latex())
+
+    biggest = max(editor.group_tracker.groups(), key=len)[0]
+    sizes = iter(block_base.STANDARD_FONT_SIZES * repeat)
+    record("propagate_font_size", lambda _: editor.propagate_font_size(biggest, next(sizes)))
+
+    path = os.path.join(workdir, f"doc{size}.eztex")
+    record("save", lambda _: save_records(path, (b.record for b in editor.blocks)))
+    record("open", lambda _: load_records(path))
+
+    if engine is not None:
+        tex = build_document(editor.gather_latex())
+        service = CompileService(engine, max_workers=1, timeout=600)
+        pdfs = []
+        record("compile", lambda _: pdfs.append(service.compile(tex).pdf))
+        if pdfs:
+            record("rasterize", lambda _: rasterize(pdfs[0], width=800))
+        service.shutdown()
+    return results
+
+
+def import_editor(repeat):
+    # Startup cost of the editor module in a fresh interpreter; PIL and
+    # pdf2image should not be part of it.
+    here = os.path.dirname(os.path.abspath(__file__))
+    code = "import sys, editor; sys.exit('PIL' in sys.modules)"
+    times, heavy = [], False
+    for _ in range(repeat):
+        start = time.perf_counter()
+        heavy |= subprocess.run([sys.executable, "-c", code], cwd=here).returncode != 0
+        times.append(time.perf_counter() - start)
+    return {"benchmark": "import_editor", "blocks": 0, "ops": 1, "median_s": statistics.median(times),
+            "min_s": min(times), "imaging_imported": heavy}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["benchmark"], r["blocks"]): r for r in json.load(f)["results"] if "median_s" in r}
+    for r in results:
+        old = baseline.get((r["benchmark"], r["blocks"]))
+        if old and "median_s" in r and old["median_s"] > 0:
+            ratio = r["median_s"] / old["median_s"]
+            flag = "  SLOWER" if ratio > 1.2 else ""
+            print(f"{r['benchmark']:24} {r['blocks']:6}  {old['median_s'] * 1000:10.3f} -> "
+                  f"{r['median_s'] * 1000:10.3f} ms  x{ratio:.2f}{flag}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark EzTeX's editor hot paths without a display.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="document sizes in blocks")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark (median reported)")
+    parser.add_argument("--engine", choices=["stub", "pdflatex", "none"], default="stub",
+                        help="compile engine; 'none' skips compile and rasterize")
+    parser.add_argument("-o", "--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="print timings against an earlier results file")
+    args = parser.parse_args(argv)
+
+    engine = {"stub": lambda: StubEngine(delay=0), "pdflatex": lambda: PdflatexEngine(PreambleFormat()),
+              "none": lambda: None}[args.engine]()
+
+    results = [import_editor(args.repeat)]
+    with tempfile.TemporaryDirectory(prefix="eztex-bench-") as workdir:
+        for size in args.sizes:
+            print(f"{size} blocks...", file=sys.stderr)
+            results.extend(run_size(size, args.repeat, engine, workdir))
+
+    report = {"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+              "engine": args.engine, "repeat": args.repeat, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
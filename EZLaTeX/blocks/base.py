@@ -1,87 +1,182 @@
 import tkinter as tk
+from tkinter import font as tkfont
+from spatial import find_snap
+from perf import PERF
+from .canvas_item import CanvasBlockItem
 
 DISPLAY_FONT_SCALE = 0.85
 STANDARD_FONT_SIZES = [8, 9, 10, 11, 12, 14, 16, 18, 20, 22, 24, 26, 28, 36]
 MODAL_OFFSET = 10
 SNAP_DISTANCE = 10
 VERTICAL_THRESHOLD = 10
+LABEL_PAD = 5        # padx/pady of the block label
+LABEL_HIGHLIGHT = 2  # its red highlightthickness
+
+def record_field(name):
+    # Exposes a field of the block's model record as an attribute of the view.
+    return property(lambda self: getattr(self.record, name),
+                    lambda self, value: setattr(self.record, name, value))
+
+_fonts = {}  # display font -> tkfont.Font, shared by every block
+
+
+def display_metrics(master, font):
+    metrics = _fonts.get(font)
+    if metrics is None:
+        metrics = _fonts[font] = tkfont.Font(root=master, font=font)
+        metrics.linespace = metrics.metrics("linespace")
+        # The label's own border width is platform dependent; ask a spare one.
+        spare = tk.Label(master)
+        metrics.inset = LABEL_PAD + int(spare.cget("borderwidth")) + LABEL_HIGHLIGHT
+        spare.destroy()
+    return metrics
+
 
 class Block:
-    def __init__(self, master, text="Block", font_size=10):
-        self.master, self.text, self.font_size = master, text, font_size
-        display_size = self.font_size if self.font_size <= 16 else int(self.font_size * DISPLAY_FONT_SCALE)
-        self.widget = tk.Label(master, text=text, bg="lightgray", relief="raised",
-                               padx=5, pady=5, font=("Helvetica", display_size), anchor="nw")
-        # Set a red border and change cursor to a hand pointer.
-        self.widget.config(highlightthickness=2, highlightbackground="red", cursor="hand2")
-        self.widget.bind("<Button-1>", self.on_click)
-        self.widget.bind("<B1-Motion>", self.on_drag)
-        self.widget.bind("<ButtonRelease-1>", self.on_release)
+    # Geometry lives on the record: set by LaTeXEditor.place_block and
+    # re-measured by update_display, so layout code never has to ask Tk.
+    x, y, w, h = record_field("x"), record_field("y"), record_field("w"), record_field("h")
+    font_size = record_field("font_size")
+
+    def __init__(self, master, record, materialize=True):
+        # record: a model.BlockRecord; this class only adds the widget and its bindings.
+        # With materialize=False the widget is left for LaTeXEditor.materialize_visible
+        # to create once the block scrolls into view. Sizes come from font metrics,
+        # not from the widget, so they are the same whether or not it exists.
+        self.master, self.record = master, record
+        self.widget = self.window = None
         self.offset_x = self.offset_y = 0
         self.dragged = False
+        if materialize or not (record.w and record.h):
+            self.measure()
+        if materialize:
+            self.materialize()
+
+    def materialize(self):
+        # Only creates the widget: the record keeps its size, so bringing a
+        # block into view never moves it or regroups anything.
+        self.widget = self.create_widget(self.record.display_text())
+
+    def place_widget(self, x, y):
+        # Labels live in canvas windows so they scroll with the page.
+        if self.widget is None:
+            return
+        PERF.count("tk_calls")
+        if isinstance(self.widget, CanvasBlockItem):
+            self.widget.place(x, y)
+        elif self.window is None:
+            self.window = self.master.create_window(x, y, window=self.widget, anchor="nw")
+        else:
+            self.master.coords(self.window, x, y)
+
+    def destroy_widget(self):
+        if self.window is not None:
+            self.master.delete(self.window)
+        if self.widget is not None:
+            self.widget.destroy()
+        self.widget = self.window = None
+
+    def display_font(self):
+        display_size = self.font_size if self.font_size <= 16 else int(self.font_size * DISPLAY_FONT_SCALE)
+        return ("Helvetica", display_size)
+
+    def create_widget(self, text):
+        font = self.display_font()
+        if self.master.editor.render_mode == "canvas":
+            widget = CanvasBlockItem(self.master, text, font, self.w, self.h)
+        else:
+            widget = tk.Label(self.master, text=text, bg="lightgray", relief="raised",
+                              padx=LABEL_PAD, pady=LABEL_PAD, font=font, anchor="nw")
+            # Set a red border and change cursor to a hand pointer.
+            widget.config(highlightthickness=LABEL_HIGHLIGHT, highlightbackground="red", cursor="hand2")
+            # The label would swallow wheel events meant for the scrolling canvas.
+            for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+                widget.bind(sequence, self.master.editor.on_mousewheel)
+        widget.bind("<Button-1>", self.on_click)
+        widget.bind("<B1-Motion>", self.on_drag)
+        widget.bind("<ButtonRelease-1>", self.on_release)
+        return widget
+
+    def update_display(self):
+        self.measure()
+        if self.widget is not None:
+            self.widget.config(text=self.record.display_text(), font=self.display_font())
+            if isinstance(self.widget, CanvasBlockItem):
+                self.widget.resize(self.w, self.h)
+
+    def measure(self):
+        # The size the label requests (text plus padding, border and highlight),
+        # worked out from the font alone so unmaterialized blocks and blocks
+        # from files that stored no size are laid out like materialized ones.
+        if self.master is None:
+            self.record.estimate_size()  # headless, no fonts to ask
+            return
+        metrics = display_metrics(self.master, self.display_font())
+        self.w = metrics.measure(self.record.display_text()) + 2 * metrics.inset
+        self.h = metrics.linespace + 2 * metrics.inset
+
+    def live_preview(self, win, **fields):
+        # Called by the edit dialogs with their StringVars by record field. Every
+        # change is handed to the editor, which previews it once typing pauses
+        # when live preview is on; closing the dialog ends it.
+        editor = self.master.editor
+        changed = lambda *args: editor.schedule_live_preview(
+            self, {name: self.dialog_value(name, var.get()) for name, var in fields.items()})
+        for var in fields.values():
+            var.trace_add("write", changed)
+        win.bind("<Destroy>", lambda e: editor.end_live_preview() if e.widget is win else None)
+
+    def dialog_value(self, name, text):
+        # What the dialog's save() stores for a field; the live preview uses the
+        # same rule. Left blank, a field keeps its current value.
+        return text.strip() or getattr(self.record, name)
 
     def on_click(self, e):
-        self.offset_x, self.offset_y = e.x, e.y
+        # Track the pointer in screen coordinates so a placement Tk has not
+        # applied yet cannot skew the next motion event.
+        self.offset_x, self.offset_y = e.x_root - self.x, e.y_root - self.y
         self.dragged = False
+        self.drag_counts = PERF.counters["tk_calls"], PERF.counters["drag_events"]
+        # Every motion event until release lands in this one undo step.
+        history = self.master.editor.history
+        history.begin("Move")
+        history.watch(self)
 
     def on_drag(self, e):
-        self.dragged = True
-        new_x = self.widget.winfo_x() + e.x - self.offset_x
-        new_y = self.widget.winfo_y() + e.y - self.offset_y
-
-        pw, ph = self.master.winfo_width(), self.master.winfo_height()
-        ww, wh = self.widget.winfo_width(), self.widget.winfo_height()
-        new_x = max(0, min(new_x, pw - ww))
-        new_y = max(0, min(new_y, ph - wh))
-
-        snapped_to = None
-        for other in self.master.editor.blocks:
-            if other is self:
-                continue
-            ox = other.widget.winfo_x()
-            oy = other.widget.winfo_y()
-            ow = other.widget.winfo_width()
-            if abs(new_x - (ox + ow)) < SNAP_DISTANCE and abs(new_y - oy) < VERTICAL_THRESHOLD:
-                occupied = False
-                for b in self.master.editor.blocks:
-                    if b is self or b is other:
-                        continue
-                    bx = b.widget.winfo_x()
-                    by = b.widget.winfo_y()
-                    if abs(bx - (ox + ow)) < 2 and abs(by - oy) < 2:
-                        occupied = True
-                        break
-                if not occupied:
-                    new_x, new_y = ox + ow, oy
-                    snapped_to = other
-                    break
-            elif abs((new_x + ww) - ox) < SNAP_DISTANCE and abs(new_y - oy) < VERTICAL_THRESHOLD:
-                occupied = False
-                for b in self.master.editor.blocks:
-                    if b is self or b is other:
-                        continue
-                    bx = b.widget.winfo_x()
-                    by = b.widget.winfo_y()
-                    if abs(bx - (ox - ww)) < 2 and abs(by - oy) < VERTICAL_THRESHOLD:
-                        occupied = True
-                        break
-                if not occupied:
-                    new_x, new_y = ox - ww, oy
-                    snapped_to = other
-                    break
-
-        self.widget.place(x=new_x, y=new_y)
-        if snapped_to is not None:
-            self.font_size = snapped_to.font_size
-            self.update_display()
-        self.master.editor.update_group_borders()
+        PERF.count("drag_events")
+        with PERF.span("drag"):
+            self.dragged = True
+            editor = self.master.editor
+            new_x = max(0, min(e.x_root - self.offset_x, editor.canvas_width - self.w))
+            new_y = max(0, min(e.y_root - self.offset_y, editor.canvas_height - self.h))
+
+            with PERF.span("snap"):
+                new_x, new_y, snapped_to = find_snap(editor.spatial_index, self, new_x, new_y, self.w,
+                                                     SNAP_DISTANCE, VERTICAL_THRESHOLD)
+            if snapped_to is not None:
+                self.font_size = snapped_to.font_size
+                self.update_display()
+            editor.place_block(self, new_x, new_y)
+            editor.update_group_borders()
 
     def on_release(self, e):
+        history = self.master.editor.history
         if not self.dragged:
+            # The dialog is modal, so its fields, a delete and the group font
+            # propagation all end up in this step.
+            history.begin("Edit")
+            history.watch(self)
             self.edit(e)
+        else:
+            # Tk calls per motion event over this drag alone, border redraws included.
+            calls, events = self.drag_counts
+            events = PERF.counters["drag_events"] - events
+            if events > 0:
+                PERF.sample("tk_per_drag", (PERF.counters["tk_calls"] - calls) / events)
+        history.end()
 
     def get_latex(self):
-        return ""
+        return self.record.get_latex()
 
     def edit(self, event):
         pass
@@ -0,0 +1,57 @@
+BORDER = 2     # red outline, same as the label's highlightthickness
+INSET = 5 + 2  # label padx/pady plus its raised border
+
+# Draws a block as a rectangle and a text item on the editor canvas, sharing one
+# tag, instead of creating a tk.Label child. It answers the handful of Label
+# calls Block and its subclasses make, so the block classes work unchanged and
+# moving a block is a single canvas.move on its tag. The rectangle is drawn at
+# the block's record size, the one snapping and group borders use.
+class CanvasBlockItem:
+    def __init__(self, canvas, text, font, width, height):
+        self.canvas = canvas
+        self.tag = f"block{id(self)}"
+        self.x = self.y = 0
+        self.rect = canvas.create_rectangle(0, 0, 0, 0, fill="lightgray", outline="red",
+                                            width=BORDER, tags=(self.tag, "block"))
+        self.text = canvas.create_text(BORDER + INSET, BORDER + INSET, text=text, font=font,
+                                       anchor="nw", tags=(self.tag, "block"))
+        canvas.tag_bind(self.tag, "<Enter>", lambda e: canvas.config(cursor="hand2"))
+        canvas.tag_bind(self.tag, "<Leave>", lambda e: canvas.config(cursor=""))
+        self.resize(width, height)
+
+    def resize(self, width, height):
+        self.width, self.height = width, height
+        half = BORDER / 2
+        self.canvas.coords(self.rect, self.x + half, self.y + half,
+                           self.x + width - half, self.y + height - half)
+
+    def config(self, text=None, font=None):
+        options = {}
+        if text is not None:
+            options["text"] = text
+        if font is not None:
+            options["font"] = font
+        self.canvas.itemconfigure(self.text, **options)
+
+    def bind(self, sequence, func):
+        self.canvas.tag_bind(self.tag, sequence, func)
+
+    def place(self, x, y):
+        self.canvas.move(self.tag, x - self.x, y - self.y)
+        self.x, self.y = x, y
+
+    def winfo_reqwidth(self):
+        return self.width
+
+    def winfo_reqheight(self):
+        return self.height
+
+    # Screen position, as for a Label: canvas coordinates less the scroll offset.
+    def winfo_rootx(self):
+        return self.canvas.winfo_rootx() + self.x - int(self.canvas.canvasx(0))
+
+    def winfo_rooty(self):
+        return self.canvas.winfo_rooty() + self.y - int(self.canvas.canvasy(0))
+
+    def destroy(self):
+        self.canvas.delete(self.tag)
@@ -1,18 +1,14 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from .base import Block, DISPLAY_FONT_SCALE, STANDARD_FONT_SIZES, MODAL_OFFSET
+from model import ExponentRecord
+from .base import Block, STANDARD_FONT_SIZES, MODAL_OFFSET, record_field
 
 class ExponentBlock(Block):
-    def __init__(self, master, base="x", exponent="2", font_size=10):
-        self.base, self.exponent = base, exponent
-        super().__init__(master, text=f"{base}^{exponent}", font_size=font_size)
+    record_type = ExponentRecord
+    base, exponent = record_field("base"), record_field("exponent")
 
-    def get_latex(self):
-        return rf"{{\fontsize{{{self.font_size}pt}}{{{self.font_size+2}pt}}\selectfont \!\ {self.base}^{{{self.exponent}}}}}"
-
-    def update_display(self):
-        display = self.font_size if self.font_size <= 16 else int(self.font_size * DISPLAY_FONT_SCALE)
-        self.widget.config(text=f"{self.base}^{self.exponent}", font=("Helvetica", display))
+    def __init__(self, master, base="x", exponent="2", font_size=10, record=None, materialize=True):
+        super().__init__(master, record or self.record_type(base, exponent, font_size), materialize)
 
     def delete_and_close(self, win):
         self.master.editor.delete_block(self)
@@ -32,6 +28,7 @@ class ExponentBlock(Block):
         tk.Label(win, text="Exponent:").pack(pady=4)
         exp_var = tk.StringVar(value=self.exponent)
         tk.Entry(win, textvariable=exp_var).pack(pady=4)
+        self.live_preview(win, base=base_var, exponent=exp_var)
 
         tk.Label(win, text="Font size:").pack(pady=4)
         size_combo = ttk.Combobox(win, values=[str(s) for s in STANDARD_FONT_SIZES], width=5)
@@ -44,8 +41,8 @@ class ExponentBlock(Block):
             except ValueError:
                 return messagebox.showerror("Invalid", "Enter integer font size.")
             self.font_size = min(STANDARD_FONT_SIZES, key=lambda s: abs(s - size))
-            self.base = base_var.get().strip() or self.base
-            self.exponent = exp_var.get().strip() or self.exponent
+            self.base = self.dialog_value("base", base_var.get())
+            self.exponent = self.dialog_value("exponent", exp_var.get())
             self.update_display()
             win.destroy()
             # Propagate new font size to the snapped group
@@ -1,18 +1,14 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from .base import Block, DISPLAY_FONT_SCALE, STANDARD_FONT_SIZES, MODAL_OFFSET
+from model import FractionRecord
+from .base import Block, STANDARD_FONT_SIZES, MODAL_OFFSET, record_field
 
 class FractionBlock(Block):
-    def __init__(self, master, numerator="1", denominator="2", font_size=10):
-        self.numerator, self.denominator = numerator, denominator
-        super().__init__(master, text=f"{numerator}/{denominator}", font_size=font_size)
+    record_type = FractionRecord
+    numerator, denominator = record_field("numerator"), record_field("denominator")
 
-    def get_latex(self):
-        return rf"{{\fontsize{{{self.font_size}pt}}{{{self.font_size+2}pt}}\selectfont \!\ \frac{{{self.numerator}}}{{{self.denominator}}}}}"
-
-    def update_display(self):
-        display = self.font_size if self.font_size <= 16 else int(self.font_size * DISPLAY_FONT_SCALE)
-        self.widget.config(text=f"{self.numerator}/{self.denominator}", font=("Helvetica", display))
+    def __init__(self, master, numerator="1", denominator="2", font_size=10, record=None, materialize=True):
+        super().__init__(master, record or self.record_type(numerator, denominator, font_size), materialize)
 
     def delete_and_close(self, win):
         self.master.editor.delete_block(self)
@@ -31,6 +27,7 @@ class FractionBlock(Block):
         tk.Label(win, text="Denominator:").pack(pady=4)
         den_var = tk.StringVar(value=self.denominator)
         tk.Entry(win, textvariable=den_var, width=10).pack(pady=4)
+        self.live_preview(win, numerator=num_var, denominator=den_var)
         tk.Label(win, text="Font size:").pack(pady=4)
         combo = ttk.Combobox(win, values=[str(s) for s in STANDARD_FONT_SIZES], width=5)
         combo.set(str(self.font_size))
@@ -42,8 +39,8 @@ class FractionBlock(Block):
             except ValueError:
                 return messagebox.showerror("Invalid", "Enter integer font size.")
             self.font_size = min(STANDARD_FONT_SIZES, key=lambda s: abs(s - size))
-            self.numerator = num_var.get().strip() or self.numerator
-            self.denominator = den_var.get().strip() or self.denominator
+            self.numerator = self.dialog_value("numerator", num_var.get())
+            self.denominator = self.dialog_value("denominator", den_var.get())
             self.update_display()
             win.destroy()
             # Propagate new font size to the snapped group
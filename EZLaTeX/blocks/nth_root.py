@@ -1,23 +1,14 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from .base import Block, DISPLAY_FONT_SCALE, STANDARD_FONT_SIZES, MODAL_OFFSET
+from model import NthRootRecord
+from .base import Block, STANDARD_FONT_SIZES, MODAL_OFFSET, record_field
 
 class NthRootBlock(Block):
-    def __init__(self, master, radicand="x", degree="2", font_size=10):
-        self.radicand = radicand
-        self.degree = degree
-        # Set the initial text representation (for dragging) based on radicand and degree.
-        super().__init__(master, text=f"√[{degree}]{{{radicand}}}", font_size=font_size)
-
-    def get_latex(self):
-        # Return raw LaTeX (without surrounding $ ... $) for an nth root.
-        # Format: \sqrt[degree]{radicand}
-        return rf"{{\fontsize{{{self.font_size}pt}}{{{self.font_size+2}pt}}\selectfont \!\ \sqrt[{self.degree}]{{{self.radicand}}}}}"
-
-    def update_display(self):
-        display = self.font_size if self.font_size <= 16 else int(self.font_size * DISPLAY_FONT_SCALE)
-        # Update the widget text to show the current radicand and degree.
-        self.widget.config(text=f"√[{self.degree}]{{{self.radicand}}}", font=("Helvetica", display))
+    record_type = NthRootRecord
+    radicand, degree = record_field("radicand"), record_field("degree")
+
+    def __init__(self, master, radicand="x", degree="2", font_size=10, record=None, materialize=True):
+        super().__init__(master, record or self.record_type(radicand, degree, font_size), materialize)
 
     def delete_and_close(self, win):
         self.master.editor.delete_block(self)
@@ -38,6 +29,7 @@ class NthRootBlock(Block):
         tk.Label(win, text="Degree:").pack(pady=4)
         degree_var = tk.StringVar(value=self.degree)
         tk.Entry(win, textvariable=degree_var, width=10).pack(pady=4)
+        self.live_preview(win, radicand=radicand_var, degree=degree_var)
 
         tk.Label(win, text="Font size:").pack(pady=4)
         size_combo = ttk.Combobox(win, values=[str(s) for s in STANDARD_FONT_SIZES], width=5)
@@ -50,8 +42,8 @@ class NthRootBlock(Block):
             except ValueError:
                 return messagebox.showerror("Invalid", "Enter an integer font size.")
             self.font_size = min(STANDARD_FONT_SIZES, key=lambda s: abs(s - size))
-            self.radicand = radicand_var.get().strip() or self.radicand
-            self.degree = degree_var.get().strip() or self.degree
+            self.radicand = self.dialog_value("radicand", radicand_var.get())
+            self.degree = self.dialog_value("degree", degree_var.get())
             self.update_display()
             win.destroy()
             self.master.editor.propagate_font_size(self, self.font_size)
@@ -1,79 +1,24 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from .base import Block, DISPLAY_FONT_SCALE, STANDARD_FONT_SIZES, MODAL_OFFSET
+from model import OperationRecord
+from .base import Block, STANDARD_FONT_SIZES, MODAL_OFFSET, record_field
 
 class OperationBlock(Block):
-    def __init__(self, master, operation="+", font_size=10):
-        self.operation = operation  # fixed at creation time
-        # For summation, initialize lower and upper limits with defaults.
-        if self.operation == "∑":
-            self.lower_limit = "i=1"
-            self.upper_limit = "n"
-        # For log, set default base and argument.
-        if self.operation.lower() == "log":
-            self.log_base = "10"
-            self.log_argument = ""
-        # For ln, just set an empty argument.
-        if self.operation.lower() == "ln":
-            self.log_argument = ""
-        super().__init__(master, text=operation, font_size=font_size)
+    record_type = OperationRecord
+    operation = record_field("operation")
+    log_base, log_argument = record_field("log_base"), record_field("log_argument")
+    lower_limit, upper_limit = record_field("lower_limit"), record_field("upper_limit")
 
-    def get_latex(self):
-        op_lower = self.operation.lower()
-        if op_lower == "x":
-            return rf"{{\fontsize{{{self.font_size}pt}}{{{self.font_size+2}pt}}\selectfont \!\ \cdot}}"
-        elif self.operation == "/":
-            return ""
-        elif self.operation == "(":
-            # Return raw commands without font size or math mode delimiters.
-            return r"\left("
-        elif self.operation == ")":
-            return r"\right)"
-        elif op_lower == "log":
-            # If no argument, output just the function name (with optional subscript if base != "10")
-            if self.log_argument:
-                if self.log_base == "10":
-                    return rf"{{\fontsize{{{self.font_size}pt}}{{{self.font_size+2}pt}}\selectfont \!\ \log\left({self.log_argument}\right)}}"
-                else:
-                    return rf"{{\fontsize{{{self.font_size}pt}}{{{self.font_size+2}pt}}\selectfont \!\ \log_{{{self.log_base}}}\left({self.log_argument}\right)}}"
-            else:
-                if self.log_base == "10":
-                    return rf"{{\fontsize{{{self.font_size}pt}}{{{self.font_size+2}pt}}\selectfont \!\ \log}}"
-                else:
-                    return rf"{{\fontsize{{{self.font_size}pt}}{{{self.font_size+2}pt}}\selectfont \!\ \log_{{{self.log_base}}}}}"
-        elif op_lower == "ln":
-            if self.log_argument:
-                return rf"{{\fontsize{{{self.font_size}pt}}{{{self.font_size+2}pt}}\selectfont \!\ \ln\left({self.log_argument}\right)}}"
-            else:
-                return rf"{{\fontsize{{{self.font_size}pt}}{{{self.font_size+2}pt}}\selectfont \!\ \ln}}"
-        elif self.operation == "∑":
-            return rf"{{\fontsize{{{self.font_size}pt}}{{{self.font_size+2}pt}}\selectfont \!\ \sum_{{{self.lower_limit}}}^{{{self.upper_limit}}}}}"
-        elif self.operation == "∏":
-            return rf"{{\fontsize{{{self.font_size}pt}}{{{self.font_size+2}pt}}\selectfont \!\ \prod}}"
-        elif self.operation == "∫":
-            return rf"{{\fontsize{{{self.font_size}pt}}{{{self.font_size+2}pt}}\selectfont \!\ \int}}"
-        else:
-            return rf"{{\fontsize{{{self.font_size}pt}}{{{self.font_size+2}pt}}\selectfont \!\ {self.operation}}}"
+    def __init__(self, master, operation="+", font_size=10, record=None, materialize=True):
+        super().__init__(master, record or self.record_type(operation, font_size=font_size), materialize)
 
-    def update_display(self):
-        display = self.font_size if self.font_size <= 16 else int(self.font_size * DISPLAY_FONT_SCALE)
-        op_lower = self.operation.lower()
-        if op_lower == "x":
-            text = "·"
-        elif op_lower in ["log", "ln"]:
-            # For display purposes, show "log" or "ln" with the argument if provided.
-            if self.log_argument:
-                if op_lower == "log" and self.log_base != "10":
-                    text = f"log₍{self.log_base}₎({self.log_argument})"
-                else:
-                    text = f"{self.operation}({self.log_argument})"
-            else:
-                text = self.operation
-        elif self.operation == "∑":
-            text = "∑"
-        else:
-            text = self.operation
-        self.widget.config(text=text, font=("Helvetica", display))
+    def dialog_value(self, name, text):
+        # A blank log base means base 10, and the argument may be left empty.
+        if name == "log_base":
+            return text.strip() or "10"
+        if name == "log_argument":
+            return text.strip()
+        return super().dialog_value(name, text)
 
     def delete_and_close(self, win):
         self.master.editor.delete_block(self)
@@ -96,6 +41,7 @@ class OperationBlock(Block):
             tk.Label(win, text="Upper Limit:").pack(pady=4)
             upper_var = tk.StringVar(value=self.upper_limit)
             tk.Entry(win, textvariable=upper_var, width=10).pack(pady=4)
+            self.live_preview(win, lower_limit=lower_var, upper_limit=upper_var)
             tk.Label(win, text="Font size:").pack(pady=4)
             size_combo = ttk.Combobox(win, values=[str(s) for s in STANDARD_FONT_SIZES], width=5)
             size_combo.set(str(self.font_size))
@@ -107,8 +53,8 @@ class OperationBlock(Block):
                 except ValueError:
                     return messagebox.showerror("Invalid", "Enter integer font size.")
                 self.font_size = min(STANDARD_FONT_SIZES, key=lambda s: abs(s - size))
-                self.lower_limit = lower_var.get().strip() or self.lower_limit
-                self.upper_limit = upper_var.get().strip() or self.upper_limit
+                self.lower_limit = self.dialog_value("lower_limit", lower_var.get())
+                self.upper_limit = self.dialog_value("upper_limit", upper_var.get())
                 self.update_display()
                 win.destroy()
                 self.master.editor.propagate_font_size(self, self.font_size)
@@ -123,6 +69,10 @@ class OperationBlock(Block):
             tk.Label(win, text="Argument:").pack(pady=4)
             arg_var = tk.StringVar(value=self.log_argument)
             tk.Entry(win, textvariable=arg_var, width=10).pack(pady=4)
+            if op_lower == "log":
+                self.live_preview(win, log_base=base_var, log_argument=arg_var)
+            else:
+                self.live_preview(win, log_argument=arg_var)
             tk.Label(win, text="Font size:").pack(pady=4)
             size_combo = ttk.Combobox(win, values=[str(s) for s in STANDARD_FONT_SIZES], width=5)
             size_combo.set(str(self.font_size))
@@ -135,9 +85,8 @@ class OperationBlock(Block):
                     return messagebox.showerror("Invalid", "Enter an integer font size.")
                 self.font_size = min(STANDARD_FONT_SIZES, key=lambda s: abs(s - size))
                 if op_lower == "log":
-                    new_base = base_var.get().strip()
-                    self.log_base = new_base if new_base and new_base != "10" else "10"
-                self.log_argument = arg_var.get().strip()
+                    self.log_base = self.dialog_value("log_base", base_var.get())
+                self.log_argument = self.dialog_value("log_argument", arg_var.get())
                 self.update_display()
                 win.destroy()
                 self.master.editor.propagate_font_size(self, self.font_size)
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import threading
+import uuid
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".eztex", "cache")
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+EVICT_TO = 0.9  # an eviction frees space down to this share of max_bytes
+
+# Content-addressed store for compile artifacts. Entries are files named
+# <sha256 of engine.version() + TeX source><suffix>, e.g. the PDF and the rendered
+# preview PNG of one document. A hit refreshes the file's mtime, and writes
+# evict the least recently used files once the directory grows past max_bytes.
+# The directory size is kept as a running total, so a write only scans the
+# directory when it has to evict; that scan also resyncs the total with what
+# other processes sharing the cache wrote.
+class CompileCache:
+    def __init__(self, engine, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.engine, self.directory, self.max_bytes = engine, directory, max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.total = sum(size for _, size, _ in self.scan())
+
+    def key(self, tex):
+        digest = hashlib.sha256(self.engine.version().encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(tex.encode("utf-8"))
+        return digest.hexdigest()
+
+    def path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def get(self, key, suffix):
+        path = self.path(key, suffix)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def read(self, key, suffix):
+        # The entry's bytes, or None on a miss. An entry evicted (by another
+        # writer) between the lookup and the read is a miss as well.
+        path = self.get(key, suffix)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, suffix, write):
+        # write(path) produces the artifact; it lands under a temporary name and
+        # is renamed into place so readers never see a half-written file.
+        path = self.path(key, suffix)
+        tmp = os.path.join(self.directory, f".{uuid.uuid4().hex}.tmp")
+        try:
+            write(tmp)
+            size = os.path.getsize(tmp)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        with self.lock:
+            self.total += size - replaced
+            over = self.total > self.max_bytes
+        if over:
+            self.evict()
+        return path
+
+    def put_bytes(self, key, suffix, data):
+        def write(path):
+            with open(path, "wb") as f:
+                f.write(data)
+        return self.put(key, suffix, write)
+
+    def scan(self):
+        # (mtime, size, path) of every entry.
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith("."):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        with self.lock:
+            entries = sorted(self.scan())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes * EVICT_TO:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+            self.total = total
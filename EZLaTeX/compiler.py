@@ -0,0 +1,426 @@
+import hashlib
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from perf import PERF
+
+PREAMBLE = r"""\documentclass[letterpaper]{article}
+\usepackage[paperwidth=800pt,paperheight=1100pt,margin=0pt]{geometry}
+\usepackage{amsmath,anyfontsize}
+\pagestyle{empty}"""
+
+
+def build_document(body):
+    return rf"""{PREAMBLE}
+\begin{{document}}
+{body}
+\end{{document}}"""
+
+
+def build_fragment(body):
+    # A single snap group, cropped to its own bounding box.
+    return rf"""\documentclass[border=0pt]{{standalone}}
+\usepackage{{amsmath,anyfontsize}}
+\begin{{document}}
+{body}
+\end{{document}}"""
+
+
+_engine_versions = {}
+
+
+def engine_version(executable="pdflatex"):
+    # The first line of `pdflatex --version` names both the engine and the TeX
+    # distribution, so an upgrade changes every cache key.
+    if executable not in _engine_versions:
+        try:
+            out = subprocess.run([executable, "--version"], capture_output=True, text=True).stdout
+        except OSError:
+            out = ""
+        _engine_versions[executable] = out.splitlines()[0] if out else executable
+    return _engine_versions[executable]
+
+
+def read_text(path):
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+class CompileError(Exception):
+    pass
+
+
+class CompileCancelled(CompileError):
+    pass
+
+
+FORMAT_DIR = os.path.join(os.path.expanduser("~"), ".eztex", "formats")
+
+
+class PreambleFormat:
+    # Most of a compile of our tiny documents is pdflatex loading article,
+    # geometry, amsmath and anyfontsize. This dumps PREAMBLE into a format file
+    # once (pdflatex -ini ... \dump) so compiles can start from it instead. The
+    # file name hashes the preamble and the TeX installation, so editing either
+    # builds a fresh format.
+    def __init__(self, preamble=PREAMBLE, directory=FORMAT_DIR, engine="pdflatex"):
+        self.preamble, self.directory, self.engine = preamble, directory, engine
+        self.lock = threading.Lock()
+        self.broken = False
+        self._path = None
+
+    def name(self):
+        executable = shutil.which(self.engine) or self.engine
+        try:
+            stamp = str(os.path.getmtime(executable))
+        except OSError:
+            stamp = ""
+        digest = hashlib.sha256("\0".join((self.preamble, engine_version(self.engine),
+                                            executable, stamp)).encode("utf-8"))
+        return f"eztex-{digest.hexdigest()[:16]}"
+
+    def path(self, timeout=None):
+        # Format path without the .fmt extension, as -fmt expects, or None when
+        # no format can be used and callers should compile the full preamble.
+        # A build that runs past timeout seconds is killed and counts as failed.
+        with self.lock:
+            if self.broken:
+                return None
+            if self._path is None:
+                base = os.path.join(self.directory, self.name())
+                if not os.path.exists(base + ".fmt") and not self.build(base, timeout):
+                    self.broken = True
+                    return None
+                self._path = base
+            return self._path
+
+    def build(self, base, timeout=None):
+        # Dump under a per-process job name and rename, so batch workers that
+        # race to build the same format never load a half-written file.
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{os.path.basename(base)}-{os.getpid()}-{threading.get_ident()}"
+        with open(os.path.join(self.directory, name + ".tex"), "w", encoding="utf-8") as f:
+            f.write(self.preamble + "\n\\dump\n")
+        try:
+            result = subprocess.run([self.engine, "-ini", f"-jobname={name}", "-interaction=nonstopmode",
+                                     f"&{self.engine}", name + ".tex"], cwd=self.directory,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+        built = os.path.join(self.directory, name + ".fmt")
+        if result.returncode != 0 or not os.path.exists(built):
+            return False
+        os.replace(built, base + ".fmt")
+        for ext in (".tex", ".log"):
+            if os.path.exists(os.path.join(self.directory, name + ext)):
+                os.remove(os.path.join(self.directory, name + ext))
+        return True
+
+    def discard(self):
+        with self.lock:
+            self.broken = True
+            if self._path is not None and os.path.exists(self._path + ".fmt"):
+                os.remove(self._path + ".fmt")
+
+
+class CompileTimeout(CompileError):
+    pass
+
+
+CompileResult = namedtuple("CompileResult", "pdf log")
+
+
+def failure_message(log):
+    # The first "! ..." line of the log is what the user needs to see.
+    for line in log.splitlines():
+        if line.startswith("!"):
+            return f"LaTeX compilation failed:\n{line}"
+    return "LaTeX compilation failed."
+
+
+class CompileJob:
+    # Cancellation handle shared by CompileService and the engine running the job.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.process = None
+        self.cancelled = threading.Event()
+
+    def started(self, process):
+        with self.lock:
+            self.process = process
+            if self.cancelled.is_set():
+                process.kill()
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled.set()
+            if self.process is not None:
+                self.process.kill()
+
+
+# Engines turn TeX into a CompileResult inside a directory they may fill freely.
+# run() must honour timeout and stop early once job.cancelled is set.
+class PdflatexEngine:
+    def __init__(self, preamble_format=None, executable="pdflatex"):
+        self.preamble_format, self.executable = preamble_format, executable
+
+    def version(self):
+        return engine_version(self.executable)
+
+    def run(self, tex, workdir, timeout, job):
+        log_path = os.path.join(workdir, "job.log")
+        fmt = None
+        if self.preamble_format is not None and tex.startswith(PREAMBLE):
+            fmt = self.preamble_format.path(timeout)
+        if fmt is not None:
+            result = self._run(tex[len(PREAMBLE):], [f"-fmt={fmt}"], workdir, timeout, job)
+            if result is not None:
+                return result
+            if os.path.exists(log_path):
+                raise CompileError(failure_message(read_text(log_path)))
+            # pdflatex stopped before opening its log, i.e. while loading the
+            # format (stale or from another TeX build): fall back for good.
+            self.preamble_format.discard()
+        result = self._run(tex, [], workdir, timeout, job)
+        if result is None:
+            raise CompileError(failure_message(read_text(log_path)))
+        return result
+
+    def _run(self, tex, options, workdir, timeout, job):
+        with open(os.path.join(workdir, "job.tex"), "w", encoding="utf-8") as f:
+            f.write(tex)
+        try:
+            process = subprocess.Popen([self.executable, *options, "-interaction=nonstopmode", "job.tex"],
+                                       cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError as e:
+            # Typically no TeX installation: reported like any failed compile.
+            raise CompileError(f"Could not run {self.executable}: {e}") from e
+        job.started(process)
+        try:
+            returncode = process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            raise CompileTimeout(f"LaTeX compilation timed out after {timeout} s.")
+        if job.cancelled.is_set():
+            raise CompileCancelled("LaTeX compilation was cancelled.")
+        pdf_path = os.path.join(workdir, "job.pdf")
+        if returncode != 0 or not os.path.exists(pdf_path):
+            return None
+        with open(pdf_path, "rb") as f:
+            pdf = f.read()
+        return CompileResult(pdf, read_text(os.path.join(workdir, "job.log")))
+
+
+def unite_pdfs(pdfs, timeout=60):
+    # Joins page PDFs (bytes) into one with poppler's pdfunite, which ships
+    # alongside the pdftoppm used for previews. Returns None when pdfunite is
+    # missing or fails, so the caller can compile the whole document instead.
+    with tempfile.TemporaryDirectory(prefix="eztex-unite-") as workdir:
+        paths = []
+        for number, pdf in enumerate(pdfs):
+            paths.append(os.path.join(workdir, f"page{number}.pdf"))
+            with open(paths[-1], "wb") as f:
+                f.write(pdf)
+        out_path = os.path.join(workdir, "document.pdf")
+        try:
+            result = subprocess.run(["pdfunite", *paths, out_path], stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.DEVNULL, timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        if result.returncode != 0 or not os.path.exists(out_path):
+            return None
+        with open(out_path, "rb") as f:
+            return f.read()
+
+
+def stub_pdf(width=800, height=1100):
+    # Smallest well-formed single blank page, so stubbed previews still rasterize.
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+               b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] >>" % (width, height)]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+class StubEngine:
+    # Stand-in for pdflatex when TeX is not installed: takes `delay` seconds per
+    # job and returns a blank page, or fails when the source contains fail_marker.
+    # Used to exercise throughput and concurrency in tests and benchmarks.
+    def __init__(self, delay=0.05, fail_marker=None):
+        self.delay, self.fail_marker = delay, fail_marker
+        self.pdf = stub_pdf()
+
+    def version(self):
+        return "stub"
+
+    def run(self, tex, workdir, timeout, job):
+        with open(os.path.join(workdir, "job.tex"), "w", encoding="utf-8") as f:
+            f.write(tex)
+        if job.cancelled.wait(min(self.delay, timeout)):
+            raise CompileCancelled("LaTeX compilation was cancelled.")
+        if self.delay > timeout:
+            raise CompileTimeout(f"LaTeX compilation timed out after {timeout} s.")
+        if self.fail_marker is not None and self.fail_marker in tex:
+            raise CompileError("LaTeX compilation failed:\n! Stub engine failure.")
+        return CompileResult(self.pdf, "stub engine\n")
+
+
+ENGINES = {"pdflatex": lambda: PdflatexEngine(PreambleFormat()), "stub": StubEngine}
+
+
+class CompileService:
+    # Compiles TeX on a bounded thread pool. Each job gets its own temporary
+    # directory, removed afterwards, and is killed once it runs past timeout
+    # seconds. submit() returns a Future holding a CompileResult (PDF bytes and
+    # log); cancel() drops a queued job or kills a running one.
+    def __init__(self, engine, max_workers=2, timeout=30, temp_root=None):
+        self.engine, self.timeout, self.temp_root = engine, timeout, temp_root
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="compile")
+        self.lock = threading.Lock()
+        self.jobs = {}
+
+    def submit(self, tex):
+        job = CompileJob()
+        future = self.pool.submit(self.compile, tex, job)
+        with self.lock:
+            self.jobs[future] = job
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future):
+        with self.lock:
+            self.jobs.pop(future, None)
+
+    def compile(self, tex, job=None):
+        # Synchronous form of submit(), for callers that manage their own threads.
+        job = job or CompileJob()
+        if job.cancelled.is_set():
+            raise CompileCancelled("LaTeX compilation was cancelled.")
+        workdir = tempfile.mkdtemp(prefix="eztex-job-", dir=self.temp_root)
+        try:
+            with PERF.span("compile"):
+                return self.engine.run(tex, workdir, self.timeout, job)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def cancel(self, future):
+        if future.cancel():
+            return
+        with self.lock:
+            job = self.jobs.get(future)
+        if job is not None:
+            job.cancel()
+
+    def shutdown(self, wait=True):
+        with self.lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            job.cancel()
+        self.pool.shutdown(wait=wait, cancel_futures=True)
+
+
+class LatestJobWorker:
+    # Runs jobs one at a time on a daemon thread. A new submission replaces any
+    # job still waiting and asks the caller to abort the one in flight, so only
+    # the latest request is ever delivered. Results come back on the Tk thread
+    # through a queue polled with root.after while a job is outstanding.
+    POLL_MS = 50
+
+    def __init__(self, root, cancel_running):
+        self.root = root
+        self.cancel_running = cancel_running
+        self.generation = 0
+        self.pending = None
+        self.waiting_for = None  # generation whose result the UI still wants
+        self.polling = False
+        self.results = queue.Queue()
+        self.wakeup = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, work, on_done, on_error):
+        self.cancel_running()
+        with self.wakeup:
+            self.generation += 1
+            self.pending = (self.generation, work, on_done, on_error)
+            self.wakeup.notify()
+        self.waiting_for = self.generation
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.POLL_MS, self._poll)
+
+    def cancel(self):
+        self.cancel_running()
+        with self.wakeup:
+            self.pending = None
+        self.waiting_for = None
+
+    def _run(self):
+        while True:
+            with self.wakeup:
+                while self.pending is None:
+                    self.wakeup.wait()
+                generation, work, on_done, on_error = self.pending
+                self.pending = None
+            try:
+                self.results.put((generation, on_done, work()))
+            except Exception as e:
+                self.results.put((generation, on_error, e))
+
+    def _poll(self):
+        while True:
+            try:
+                generation, callback, value = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if generation == self.waiting_for:
+                self.waiting_for = None
+                callback(value)
+        if self.waiting_for is None:
+            self.polling = False
+        else:
+            self.root.after(self.POLL_MS, self._poll)
+
+
+def compare_preamble_startup(runs=5):
+    # Times the same one-line document compiled with the full preamble and with
+    # the dumped format: python compiler.py [runs]
+    tex = build_document(r"\mbox{$x^{2}+\frac{1}{2}$}")
+    preamble_format = PreambleFormat()
+    plain = CompileService(PdflatexEngine(), max_workers=1)
+    fast = CompileService(PdflatexEngine(preamble_format), max_workers=1)
+    fast.compile(tex)  # builds the format if it is not cached yet
+    if preamble_format.broken:
+        print("Could not build or load a preamble format; nothing to compare.")
+        return
+    for label, service in (("full preamble", plain), ("dumped format", fast)):
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            service.compile(tex)
+            times.append(time.perf_counter() - start)
+        print(f"{label:>14}: best {min(times) * 1000:.0f} ms, mean {sum(times) / runs * 1000:.0f} ms over {runs} runs")
+
+
+if __name__ == "__main__":
+    compare_preamble_startup(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -1,11 +1,8 @@
-import os
-import subprocess
-import json
-import shutil
+import io
+import time
+from collections import namedtuple
 import tkinter as tk
 from tkinter import Menu, filedialog, messagebox
-from pdf2image import convert_from_path
-from PIL import Image, ImageTk
 
 def extract_math(expr):
     expr = expr.strip()
@@ -19,32 +16,145 @@ from blocks.exponent import ExponentBlock
 from blocks.fraction import FractionBlock
 from blocks.operation import OperationBlock
 from blocks.nth_root import NthRootBlock
-
-SNAP_DISTANCE = 5
-VERTICAL_THRESHOLD = 10
+from blocks import base as block_base
+from spatial import SpatialGrid
+from groups import GroupTracker, SNAP_DISTANCE, VERTICAL_THRESHOLD
+from compiler import (CompileError, CompileService, LatestJobWorker, PdflatexEngine, PreambleFormat,
+                      build_document, build_fragment, unite_pdfs)
+from compile_cache import CompileCache
+from latex import PAGE_HEIGHT, PAGE_WIDTH, PictureCache, group_latex, page_of, page_picture, put_latex
+from serializer import EXTENSION, load_records, save_records
+from history import UndoHistory
+from journal import Journal
+from raster import rasterize
+from perf import PERF
+from native_render import TkMetrics, draw_group
+
+COMPILE_TIMEOUT = 30  # seconds before a runaway pdflatex is killed
+PREVIEW_WIDTH, PREVIEW_HEIGHT = 800, 1100  # preview page in pixels (one per point)
+PREVIEW_GAP = 20  # pixels between pages in the preview
+LIVE_PREVIEW_DELAY_MS = 350  # pause in typing before a live preview compiles
+HUD_REFRESH_MS = 500
+# Process start to first painted window. A placeholder, not a measurement:
+# replace it with a `main.py --startup-time` result from the slowest machine
+# EzTeX has to support.
+FIRST_WINDOW_TARGET_MS = 1500
+
+# What one preview page shows. engine is "pdflatex" (payload: the page's TeX
+# document), "fragments" (payload: (x, y, TeX) per group) or "native"
+# (payload: (the page's picture, its groups' records) for the built-in engine).
+PreviewSource = namedtuple("PreviewSource", "engine payload draft")
+MATERIALIZE_MARGIN = 300  # widgets are created this far beyond the visible area
+JOURNAL_FLUSH_MS = 250  # changes reach the autosave journal at most this late
+# Record kind -> Tk view class, used when loading documents.
+BLOCK_VIEWS = {cls.record_type.kind: cls for cls in (ExponentBlock, FractionBlock, OperationBlock, NthRootBlock)}
+DOCUMENT_FILETYPES = [("EZLaTeX Files", "*" + EXTENSION), ("EZLaTeX Files (old format)", "*.json"),
+                      ("All Files", "*.*")]
 
 class LaTeXEditor:
-    def __init__(self, root):
+    # PIL and pdf2image are imported on first preview, and the preview canvas
+    # is built once the editor has been painted, so neither holds up startup.
+    # started is the time.perf_counter() the process began at; the time to the
+    # first painted window is then recorded as the "first_window" span.
+    def __init__(self, root, render_mode="label", started=None):
         self.root = root
+        self.started = started
+        self.first_window_ms = None
         self.root.title("EzTeX")
         self.root.geometry("1400x900")
         self.blocks = []
         self.current_file = None
-        self.preview_image = None
+        # Preview pages: what each page shows (a PreviewSource), and
+        # page -> (that source, PhotoImage, canvas item) for
+        # the pages currently rasterized; only those near the view are kept.
+        self.preview_sources = []
+        self.preview_shown = {}
+        self.preview_inflight = None
+        self.preview_scroll_pending = False
+        self.live_preview_after = None  # after() id of the live preview waiting for typing to pause
+        self.live_previewed = False
+        self.native_metrics = None  # font metrics for the built-in draft engine, made on first use
         self.code_text = None  # For "View Code" mode
-        self.group_borders = []  # IDs of blue rectangles for snapped groups
+        self.group_borders = {}  # group id -> ID of the blue rectangle drawn around it
+        self.borders_pending = False
+        self.materialize_pending = False
+        # Moves, edits, adds and deletes as undoable deltas (Edit > Undo/Redo).
+        self.history = UndoHistory()
+        # Append-only autosave of every change, replayed after a crash.
+        self.journal = Journal()
+        self.journal_pending = False
+        # Edge index used by Block.on_drag for snap and occupancy lookups.
+        self.spatial_index = SpatialGrid(block_base.SNAP_DISTANCE, block_base.VERTICAL_THRESHOLD)
+        # Snap groups, kept up to date by place_block/delete_block rather than rescanned.
+        self.group_tracker = GroupTracker(self.spatial_index, SNAP_DISTANCE, VERTICAL_THRESHOLD)
+        # "label" gives every block its own tk.Label; "canvas" draws blocks as canvas items.
+        self.render_mode = render_mode
+        # Per-group \put lines, rebuilt only for groups whose blocks changed.
+        self.picture_cache = PictureCache()
+        self.gathered = (None, None)  # (revision, page pictures) of the last gather_pages
+        # Every compile runs in its own scratch directory, starting from a dumped
+        # format of the fixed preamble when pdflatex allows it. Previews are driven
+        # from a worker thread; the future of the compile in flight can be killed.
+        engine = PdflatexEngine(PreambleFormat())
+        self.compile_service = CompileService(engine, max_workers=2, timeout=COMPILE_TIMEOUT)
+        self.preview_future = None
+        # Bumped by every change to the document; gather_pages is memoized on it,
+        # and the last exported PDF is remembered as (revision, cache key) so an
+        # unchanged document exports without regenerating or uniting anything.
+        self.revision = 0
+        self.compiled_pdf = (None, None)
+        self.preview_started = None  # perf_counter() when the preview in flight was requested
+        self.preview_worker = LatestJobWorker(root, self.cancel_preview_compile)
+        # PDFs and preview images keyed by the full TeX source, shared across sessions.
+        self.compile_cache = CompileCache(engine)
 
         menubar = Menu(root)
         file_menu = Menu(menubar, tearoff=0)
         file_menu.add_command(label="New", command=self.new_document)
         file_menu.add_command(label="Open", command=self.open_document)
         file_menu.add_command(label="Save", command=self.save_document)
+        file_menu.add_command(label="Export Performance Data…", command=self.export_perf_data)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=root.quit)
+        file_menu.add_command(label="Exit", command=self.quit_editor)
         menubar.add_cascade(label="File", menu=file_menu)
+        edit_menu = Menu(menubar, tearoff=0)
+        edit_menu.add_command(label="Undo", accelerator="Ctrl+Z", command=self.undo)
+        edit_menu.add_command(label="Redo", accelerator="Ctrl+Y", command=self.redo)
+        menubar.add_cascade(label="Edit", menu=edit_menu)
+        root.bind("<Control-z>", lambda e: self.undo())
+        root.bind("<Control-y>", lambda e: self.redo())
+        root.bind("<Control-Z>", lambda e: self.redo())  # Ctrl+Shift+Z
+        view_menu = Menu(menubar, tearoff=0)
+        self.canvas_items_var = tk.BooleanVar(value=render_mode == "canvas")
+        view_menu.add_checkbutton(label="Draw Blocks as Canvas Items", variable=self.canvas_items_var,
+                                  command=lambda: self.set_render_mode("canvas" if self.canvas_items_var.get() else "label"))
+        # Incremental preview compiles each snap group on its own and composites the images.
+        self.incremental_preview_var = tk.BooleanVar(value=False)
+        view_menu.add_checkbutton(label="Incremental Preview", variable=self.incremental_preview_var)
+        # Draft previews are grayscale and not anti-aliased; quicker to rasterize.
+        self.draft_preview_var = tk.BooleanVar(value=False)
+        view_menu.add_checkbutton(label="Grayscale Preview (faster)", variable=self.draft_preview_var)
+        # The draft engine lays the blocks out itself and draws them in
+        # milliseconds (see native_render.py); the final engine is pdflatex,
+        # which Export always uses.
+        self.preview_engine_var = tk.StringVar(value="final")
+        engine_menu = Menu(view_menu, tearoff=0)
+        for label, value in (("Final (pdflatex)", "final"), ("Draft (built-in, instant)", "native")):
+            engine_menu.add_radiobutton(label=label, value=value, variable=self.preview_engine_var,
+                                        command=lambda: self.preview_latex() if self.preview_sources else None)
+        view_menu.add_cascade(label="Preview Engine", menu=engine_menu)
+        # Live preview recompiles the edited block's page while its edit dialog is open.
+        self.live_preview_var = tk.BooleanVar(value=False)
+        view_menu.add_checkbutton(label="Live Preview While Editing", variable=self.live_preview_var)
+        # Rolling timings of the hot paths in a status bar (see perf.py).
+        self.perf_hud_var = tk.BooleanVar(value=False)
+        view_menu.add_checkbutton(label="Performance HUD", variable=self.perf_hud_var, command=self.toggle_perf_hud)
+        menubar.add_cascade(label="View", menu=view_menu)
         root.config(menu=menubar)
 
         self.setup_ui()
+        root.protocol("WM_DELETE_WINDOW", self.quit_editor)
+        self.recover_journal()
 
     def setup_ui(self):
         self.main_frame = tk.Frame(self.root, bg="lightgray")
@@ -52,6 +162,8 @@ class LaTeXEditor:
 
         self.editor_preview_frame = tk.Frame(self.main_frame, bg="lightgray")
         self.editor_preview_frame.pack(fill="both", expand=True)
+        self.perf_hud = tk.Label(self.main_frame, text="", anchor="w", bg="gray20", fg="white",
+                                 font=("Courier", 9))
 
         # Editor column:
         editor_column = tk.Frame(self.editor_preview_frame, bg="lightgray")
@@ -75,6 +187,7 @@ class LaTeXEditor:
         tk.Button(editor_toolbar, text=")", command=lambda: self.add_operation(")"), cursor="hand2").pack(side="left", padx=2)
         tk.Button(editor_toolbar, text="log", command=lambda: self.add_operation("log"), cursor="hand2").pack(side="left", padx=2)
         tk.Button(editor_toolbar, text="ln", command=lambda: self.add_operation("ln"), cursor="hand2").pack(side="left", padx=2)
+        tk.Button(editor_toolbar, text="Add Page", command=self.add_page, cursor="hand2").pack(side="left", padx=5)
 
 
 
@@ -83,8 +196,17 @@ class LaTeXEditor:
 
         # Changed from width=800, height=1100 to bigger size (e.g. 800×1000)
         self.editor_canvas = tk.Canvas(self.editor_page_frame, width=800, height=1000, bg="white")
-        self.editor_canvas.pack()
+        editor_scrollbar = tk.Scrollbar(self.editor_page_frame, orient="vertical", command=self.editor_canvas.yview)
+        self.editor_canvas.config(yscrollcommand=lambda first, last: (editor_scrollbar.set(first, last),
+                                                                      self.schedule_materialize()))
+        self.editor_canvas.pack(side="left")
+        editor_scrollbar.pack(side="left", fill="y")
         self.editor_canvas.editor = self
+        # Drag clamping reads the page size from here instead of querying Tk per motion event.
+        self.update_scrollregion(PAGE_HEIGHT)
+        self.editor_canvas.bind("<Configure>", self.on_canvas_configure)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.editor_canvas.bind(sequence, self.on_mousewheel)
 
         # Preview column:
         preview_column = tk.Frame(self.editor_preview_frame, bg="lightgray")
@@ -95,37 +217,207 @@ class LaTeXEditor:
         tk.Button(preview_toolbar, text="Preview LaTeX", command=self.preview_latex).pack(side="left", padx=5)
         tk.Button(preview_toolbar, text="View Code", command=self.view_code).pack(side="left", padx=5)
         tk.Button(preview_toolbar, text="Export PDF", command=self.export_pdf).pack(side="left", padx=5)
+        self.preview_status = tk.Label(preview_toolbar, text="", bg="lightgray")
+        self.preview_status.pack(side="left", padx=5)
 
-        self.preview_page_frame = tk.Frame(preview_column, bg="white", bd=2, relief="ridge")
+        # Sized like the canvas it will hold, so the layout does not shift when it appears.
+        self.preview_page_frame = tk.Frame(preview_column, bg="white", bd=2, relief="ridge", width=800, height=1000)
         self.preview_page_frame.pack(expand=True, fill="both", pady=(5,0))
-
-        # Make the preview canvas match the editor canvas size
-        self.preview_canvas = tk.Canvas(self.preview_page_frame, width=800, height=1000, bg="white")
-        self.preview_canvas.pack()
-        self.preview_canvas.editor = self
-
+        self.preview_canvas = None
+        self.editor_canvas.bind("<Map>", self.on_first_map)
+
+    def on_first_map(self, e):
+        self.editor_canvas.unbind("<Map>")
+        # Idle callbacks queued now run after Tk has drawn the window.
+        self.root.after_idle(self.on_first_paint)
+
+    def on_first_paint(self):
+        if self.started is not None:
+            self.first_window_ms = (time.perf_counter() - self.started) * 1000
+            PERF.add("first_window", self.first_window_ms)
+        self.ensure_preview_canvas()
+        self.root.event_generate("<<FirstWindow>>")
+
+    def ensure_preview_canvas(self):
+        if self.preview_canvas is None:
+            # Make the preview canvas match the editor canvas size
+            self.preview_canvas = tk.Canvas(self.preview_page_frame, width=800, height=1000, bg="lightgray")
+            preview_scrollbar = tk.Scrollbar(self.preview_page_frame, orient="vertical",
+                                             command=self.preview_canvas.yview)
+            self.preview_canvas.config(yscrollcommand=lambda first, last: (preview_scrollbar.set(first, last),
+                                                                           self.schedule_preview_pages()))
+            self.preview_canvas.pack(side="left")
+            preview_scrollbar.pack(side="left", fill="y")
+            self.preview_canvas.editor = self
+            for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+                self.preview_canvas.bind(sequence, lambda e: self.on_mousewheel(e, self.preview_canvas))
+        return self.preview_canvas
+
+    def on_canvas_configure(self, e):
+        self.schedule_materialize()
+
+    def on_mousewheel(self, e, canvas=None):
+        canvas = canvas or self.editor_canvas
+        if e.num == 4 or e.delta > 0:
+            canvas.yview_scroll(-1, "units")
+        else:
+            canvas.yview_scroll(1, "units")
+
+    def update_scrollregion(self, height):
+        # The canvas is a column of whole pages, enough to reach the lowest block.
+        pages = max(1, -(-int(height) // PAGE_HEIGHT))
+        self.canvas_width, self.canvas_height = PAGE_WIDTH, pages * PAGE_HEIGHT
+        self.editor_canvas.config(scrollregion=(0, 0, self.canvas_width, self.canvas_height))
+        self.editor_canvas.delete("page_break")
+        for page in range(1, pages):
+            line = self.editor_canvas.create_line(0, page * PAGE_HEIGHT, PAGE_WIDTH, page * PAGE_HEIGHT,
+                                                  fill="gray", dash=(6, 4), tags="page_break")
+            self.editor_canvas.tag_lower(line)
+
+    def page_in_view(self):
+        middle = self.editor_canvas.canvasy(0) + self.editor_canvas.winfo_height() / 2
+        return min(int(middle) // PAGE_HEIGHT, self.canvas_height // PAGE_HEIGHT - 1)
+
+    def add_page(self):
+        self.update_scrollregion(self.canvas_height + PAGE_HEIGHT)
+        self.editor_canvas.yview_moveto((self.canvas_height - PAGE_HEIGHT) / self.canvas_height)
+
+    def schedule_materialize(self):
+        if not self.materialize_pending:
+            self.materialize_pending = True
+            self.root.after_idle(self.materialize_visible)
+
+    def materialize_visible(self):
+        # Creates widgets for blocks loaded without one once they come near the viewport.
+        self.materialize_pending = False
+        top = self.editor_canvas.canvasy(0)
+        bottom = top + self.editor_canvas.winfo_height()
+        for b in self.spatial_index.blocks_in(-MATERIALIZE_MARGIN, top - MATERIALIZE_MARGIN,
+                                              self.canvas_width + MATERIALIZE_MARGIN, bottom + MATERIALIZE_MARGIN):
+            if b.widget is None:
+                b.materialize()
+                b.place_widget(b.x, b.y)
 
     def update_group_borders(self):
-        # Clear existing borders.
-        for rect in self.group_borders:
-            self.editor_canvas.delete(rect)
-        self.group_borders = []
-        groups = self.get_groups()
-        for group in groups:
-            if len(group) > 1:
-                xs = [b.widget.winfo_x() for b in group]
-                ys = [b.widget.winfo_y() for b in group]
-                widths = [b.widget.winfo_width() for b in group]
-                heights = [b.widget.winfo_height() for b in group]
-                min_x = min(xs)
-                min_y = min(ys)
-                max_x = max(x+w for x,w in zip(xs,widths))
-                max_y = max(y+h for y,h in zip(ys,heights))
-                pad = 2
-                rect = self.editor_canvas.create_rectangle(min_x-pad, min_y-pad, max_x+pad, max_y+pad,
-                                                             outline="blue", width=2)
+        # Coalesce a burst of motion events into a single redraw once Tk is idle.
+        if not self.borders_pending:
+            self.borders_pending = True
+            self.root.after_idle(self.redraw_group_borders)
+
+    def redraw_group_borders(self):
+        with PERF.span("redraw_borders"):
+            self._redraw_group_borders()
+
+    def _redraw_group_borders(self):
+        self.borders_pending = False
+        # Only groups the tracker saw change need their rectangle touched.
+        for gid in self.group_tracker.take_changed():
+            group = self.group_tracker.members.get(gid)
+            rect = self.group_borders.get(gid)
+            if group is None or len(group) < 2:
+                if rect is not None:
+                    self.editor_canvas.delete(rect)
+                    PERF.count("tk_calls")
+                    del self.group_borders[gid]
+                continue
+            pad = 2
+            coords = (min(b.x for b in group) - pad, min(b.y for b in group) - pad,
+                      max(b.x + b.w for b in group) + pad, max(b.y + b.h for b in group) + pad)
+            if rect is None:
+                rect = self.editor_canvas.create_rectangle(*coords, outline="blue", width=2)
                 self.editor_canvas.tag_lower(rect)
-                self.group_borders.append(rect)
+                PERF.count("tk_calls", 2)
+                self.group_borders[gid] = rect
+            else:
+                self.editor_canvas.coords(rect, *coords)
+                PERF.count("tk_calls")
+
+    def mark_changed(self):
+        self.revision += 1
+        if not self.journal_pending:
+            self.journal_pending = True
+            self.root.after(JOURNAL_FLUSH_MS, self.flush_journal)
+
+    def flush_journal(self):
+        self.journal_pending = False
+        self.journal.flush()
+        if self.journal.needs_compaction():
+            self.journal.start(self.blocks, self.current_file)
+
+    def recover_journal(self):
+        # A journal left behind by an instance that is no longer running means
+        # that session ended without a clean exit. One is recovered per start.
+        if self.journal.pending():
+            try:
+                records, path = self.journal.recover()
+            except (OSError, ValueError, KeyError, IndexError):
+                records, path = [], None
+            if records and messagebox.askyesno(
+                    "Recover", f"EzTeX did not close properly last time.\n"
+                               f"Recover the unsaved document ({len(records)} blocks)?"):
+                self.load_blocks(records)
+                self.current_file = path
+        self.journal.start(self.blocks, self.current_file)
+        # Recovered blocks are in this instance's checkpoint now (or were declined).
+        self.journal.discard_orphan()
+
+    def quit_editor(self):
+        # Leaving on purpose: nothing to recover next time. Compiles still
+        # running are killed and their scratch directories removed.
+        self.journal.finish()
+        self.preview_worker.cancel()
+        self.compile_service.shutdown()
+        self.root.quit()
+
+    def toggle_perf_hud(self):
+        if self.perf_hud_var.get():
+            self.perf_hud.pack(side="bottom", fill="x", before=self.editor_preview_frame)
+            self.refresh_perf_hud()
+        else:
+            self.perf_hud.pack_forget()
+
+    def refresh_perf_hud(self):
+        if not self.perf_hud_var.get():
+            return
+        parts = []
+        for name in ("drag", "redraw_borders", "compile", "rasterize", "photoimage", "preview", "native_render"):
+            rolling = PERF.rolling(name)
+            if rolling is not None:
+                parts.append(f"{name} {rolling[0]:.1f}/{rolling[1]:.1f}ms")
+        tk_per_drag = PERF.mean("tk_per_drag")
+        if tk_per_drag is not None:
+            parts.append(f"tk/drag {tk_per_drag:.1f}")
+        parts.append(f"blocks {len(self.blocks)}  groups {len(self.group_tracker.members)}")
+        self.perf_hud.config(text="  (mean/p95)  " + "  |  ".join(parts))
+        self.root.after(HUD_REFRESH_MS, self.refresh_perf_hud)
+
+    def export_perf_data(self):
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON", "*.json")],
+                                            initialfile="eztex-perf.json")
+        if path:
+            PERF.export(path, blocks=len(self.blocks), groups=len(self.group_tracker.members),
+                        render_mode=self.render_mode)
+
+    def place_block(self, block, x, y):
+        self.history.watch(block)
+        self.journal.touch(block)
+        self.mark_changed()
+        block.x, block.y = x, y
+        block.place_widget(x, y)
+        if y + block.h > self.canvas_height:
+            self.update_scrollregion(y + block.h)
+        self.spatial_index.insert(block, x, y, block.w, block.h)
+        self.group_tracker.update(block)
+
+    def set_render_mode(self, mode):
+        if mode == self.render_mode:
+            return
+        self.render_mode = mode
+        # Only blocks near the viewport get their new widget now; the rest on scroll.
+        for b in self.blocks:
+            b.destroy_widget()
+        self.materialize_visible()
+        self.update_group_borders()
 
     def find_free_position(self, default_x, default_y, block_width, block_height):
         x, y = default_x, default_y
@@ -133,12 +425,8 @@ class LaTeXEditor:
         while overlap:
             overlap = False
             for b in self.blocks:
-                bx = b.widget.winfo_x()
-                by = b.widget.winfo_y()
-                bw = b.widget.winfo_width()
-                bh = b.widget.winfo_height()
-                if (x < bx + bw and x + block_width > bx and
-                    y < by + bh and y + block_height > by):
+                if (x < b.x + b.w and x + block_width > b.x and
+                    y < b.y + b.h and y + block_height > b.y):
                     overlap = True
                     x += 10
                     y += 10
@@ -146,215 +434,404 @@ class LaTeXEditor:
         return x, y
 
     def get_groups(self):
-        visited = set()
-        groups = []
-        for b in self.blocks:
-            if b in visited:
-                continue
-            stack = [b]
-            group = [b]
-            visited.add(b)
-            while stack:
-                cur = stack.pop()
-                cx, cy = cur.widget.winfo_x(), cur.widget.winfo_y()
-                cw = cur.widget.winfo_width()
-                for other in self.blocks:
-                    if other in visited:
-                        continue
-                    ox, oy = other.widget.winfo_x(), other.widget.winfo_y()
-                    ow = other.widget.winfo_width()
-                    if abs(cx+cw-ox) < SNAP_DISTANCE and abs(cy-oy) < VERTICAL_THRESHOLD:
-                        visited.add(other)
-                        stack.append(other)
-                        group.append(other)
-                    elif abs(cx - (ox+ow)) < SNAP_DISTANCE and abs(cy-oy) < VERTICAL_THRESHOLD:
-                        visited.add(other)
-                        stack.append(other)
-                        group.append(other)
-            groups.append(sorted(group, key=lambda blk: blk.widget.winfo_x()))
-        return groups
+        with PERF.span("get_groups"):
+            return self.group_tracker.groups()
+
+    def gather_pages(self):
+        # The picture of every page; an unchanged document is not even walked again.
+        with PERF.span("gather_latex"):
+            if self.gathered[0] != self.revision:
+                self.gathered = (self.revision, self.picture_cache.pages(self.get_groups()))
+            return self.gathered[1]
 
     def gather_latex(self):
-        groups = self.get_groups()
-        if not groups:
-            return r"\mbox{}"
-        lines = [r"\setlength{\unitlength}{1pt}", r"\begin{picture}(800,1100)"]
-        for group in groups:
-            sorted_group = sorted(group, key=lambda blk: blk.widget.winfo_x())
-            first_block = sorted_group[0]
-            x = first_block.widget.winfo_x()
-            y_inv = 1100 - first_block.widget.winfo_y()
-            # Simply concatenate the raw LaTeX from each block.
-            combined_expr = "".join(b.get_latex().strip() for b in sorted_group)
-            # Wrap the entire expression in one math mode and font size command.
-            combined_wrapped = rf"\fontsize{{{first_block.font_size}pt}}{{{first_block.font_size+2}pt}}\selectfont ${combined_expr}$"
-            lines.append(fr"\put({x},{y_inv}){{\makebox(0,0)[lt]{{{combined_wrapped}}}}}")
-        lines.append(r"\end{picture}")
-        return "\n".join(lines)
+        return self.picture_cache.joined(self.gather_pages())
 
 
     def new_document(self):
         for b in self.blocks:
-            b.widget.destroy()
+            b.destroy_widget()
         self.blocks.clear()
+        self.group_tracker.clear()
+        self.spatial_index.clear()
+        self.group_borders.clear()
         self.editor_canvas.delete("all")
+        self.update_scrollregion(PAGE_HEIGHT)
         self.current_file = None
+        self.history.clear()
+        self.journal.start([])
+        self.mark_changed()
 
     def delete_block(self, block):
         if block in self.blocks:
             self.blocks.remove(block)
-            block.widget.destroy()
+            self.group_tracker.remove(block)
+            self.spatial_index.remove(block)
+            self.history.block_removed(block)
+            self.journal.removed(block)
+            block.destroy_widget()
+            self.mark_changed()
+            self.update_group_borders()
 
     def save_document(self):
-        path = filedialog.asksaveasfilename(defaultextension=".json",
-                                            filetypes=[("EZLaTeX Files", "*.json"), ("All Files", "*.*")])
+        path = filedialog.asksaveasfilename(defaultextension=EXTENSION, filetypes=DOCUMENT_FILETYPES)
         if not path:
             return
         try:
-            blocks_data = []
-            for b in self.blocks:
-                block_dict = {"x": b.widget.winfo_x(),
-                              "y": b.widget.winfo_y(),
-                              "font_size": b.font_size}
-                if hasattr(b, "base") and hasattr(b, "exponent"):
-                    block_dict["type"] = "exponent"
-                    block_dict["base"] = b.base
-                    block_dict["exponent"] = b.exponent
-                elif hasattr(b, "numerator") and hasattr(b, "denominator"):
-                    block_dict["type"] = "fraction"
-                    block_dict["numerator"] = b.numerator
-                    block_dict["denominator"] = b.denominator
-                elif hasattr(b, "operation"):
-                    block_dict["type"] = "operation"
-                    block_dict["operation"] = b.operation
-                elif hasattr(b, "radicand") and hasattr(b, "degree"):
-                    block_dict["type"] = "nthroot"
-                    block_dict["radicand"] = b.radicand
-                    block_dict["degree"] = b.degree
-                else:
-                    continue
-                blocks_data.append(block_dict)
-            data = {"blocks": blocks_data}
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=4)
+            save_records(path, (b.record for b in self.blocks))
             self.current_file = path
+            self.journal.start(self.blocks, path)
             messagebox.showinfo("Save", "File saved successfully.")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save file:\n{str(e)}")
 
     def open_document(self):
-        path = filedialog.askopenfilename(filetypes=[("EZLaTeX Files", "*.json"), ("All Files", "*.*")])
+        path = filedialog.askopenfilename(filetypes=DOCUMENT_FILETYPES)
         if not path:
             return
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            records = load_records(path, sized=False)
             self.new_document()
-            for entry in data["blocks"]:
-                typ = entry.get("type")
-                if typ == "exponent":
-                    b = ExponentBlock(self.editor_canvas, entry.get("base", "x"),
-                                      entry.get("exponent", "2"), entry.get("font_size", 10))
-                elif typ == "fraction":
-                    b = FractionBlock(self.editor_canvas, entry.get("numerator", "1"),
-                                      entry.get("denominator", "2"), entry.get("font_size", 10))
-                elif typ == "operation":
-                    b = OperationBlock(self.editor_canvas, entry.get("operation", "+"), entry.get("font_size", 10))
-                elif typ == "nthroot":
-                    b = NthRootBlock(self.editor_canvas, entry.get("radicand", "x"),
-                                     entry.get("degree", "2"), entry.get("font_size", 10))
-                else:
-                    continue
-                b.widget.place(x=entry.get("x", 0), y=entry.get("y", 0))
-                self.blocks.append(b)
+            self.load_blocks(records)
             self.current_file = path
+            self.journal.start(self.blocks, path)
             messagebox.showinfo("Open", "File loaded successfully.")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to open file:\n{str(e)}")
 
-    def add_exponent(self):
-        b = ExponentBlock(self.editor_canvas)
-        self.editor_canvas.update_idletasks()
-        bw = b.widget.winfo_width()
-        bh = b.widget.winfo_height()
-        x, y = self.find_free_position(50, 50, bw, bh)
-        b.widget.place(x=x, y=y)
-        self.blocks.append(b)
+    def load_blocks(self, records):
+        # Index every block first without any widgets, then build only the
+        # ones in view in one go and draw the group borders once.
+        self.update_scrollregion(max((r.y + r.h for r in records), default=0))
+        for record in records:
+            b = BLOCK_VIEWS[record.kind](self.editor_canvas, record=record, materialize=False)
+            self.blocks.append(b)
+            self.place_block(b, record.x, record.y)
+        self.editor_canvas.yview_moveto(0)
+        self.materialize_visible()
         self.update_group_borders()
 
+    def add_exponent(self):
+        self.insert_block(ExponentBlock(self.editor_canvas), 50, 50)
+
     def add_fraction(self):
-        b = FractionBlock(self.editor_canvas)
-        self.editor_canvas.update_idletasks()
-        bw = b.widget.winfo_width()
-        bh = b.widget.winfo_height()
-        x, y = self.find_free_position(50, 150, bw, bh)
-        b.widget.place(x=x, y=y)
-        self.blocks.append(b)
-        self.update_group_borders()
+        self.insert_block(FractionBlock(self.editor_canvas), 50, 150)
 
     def add_operation(self, op="+"):
-        b = OperationBlock(self.editor_canvas, operation=op)
-        self.editor_canvas.update_idletasks()
-        bw = b.widget.winfo_width()
-        bh = b.widget.winfo_height()
-        x, y = self.find_free_position(50, 250, bw, bh)
-        b.widget.place(x=x, y=y)
-        self.blocks.append(b)
-        self.update_group_borders()
+        self.insert_block(OperationBlock(self.editor_canvas, operation=op), 50, 250)
 
     def add_nthroot(self):
-        b = NthRootBlock(self.editor_canvas)
-        self.editor_canvas.update_idletasks()
-        bw = b.widget.winfo_width()
-        bh = b.widget.winfo_height()
-        x, y = self.find_free_position(50, 350, bw, bh)
-        b.widget.place(x=x, y=y)
+        self.insert_block(NthRootBlock(self.editor_canvas), 50, 350)
+
+    def insert_block(self, b, default_x, default_y):
+        # New blocks go on the page in view, at the usual spot on it.
+        self.history.begin("Add")
+        x, y = self.find_free_position(default_x, self.page_in_view() * PAGE_HEIGHT + default_y, b.w, b.h)
         self.blocks.append(b)
+        self.history.block_added(b)
+        self.place_block(b, x, y)
+        self.history.end()
+        self.update_group_borders()
+
+    # Undo/redo target (see history.UndoHistory).
+    def add_block(self, block):
+        if block.widget is None:
+            block.materialize()
+        self.blocks.append(block)
+        self.place_block(block, block.x, block.y)
         self.update_group_borders()
 
-    def compile_latex_to_pdf(self, latex):
-        tex = rf"""\documentclass[letterpaper]{{article}}
-\usepackage[paperwidth=800pt,paperheight=1100pt,margin=0pt]{{geometry}}
-\usepackage{{amsmath,anyfontsize}}
-\pagestyle{{empty}}
-\begin{{document}}
-{latex}
-\end{{document}}"""
-        with open("preview.tex", "w", encoding="utf-8") as f:
-            f.write(tex)
+    def remove_block(self, block):
+        self.delete_block(block)
+
+    def set_fields(self, block, values):
+        for name, value in values.items():
+            setattr(block.record, name, value)
+        if block in self.spatial_index.bounds:
+            if block.widget is not None:
+                block.update_display()
+            self.place_block(block, block.x, block.y)
+            self.update_group_borders()
+
+    def undo(self):
+        self.history.undo(self)
+
+    def redo(self):
+        self.history.redo(self)
+
+    def compile_latex_to_pdf(self):
+        # Every page compiles as a document of its own and the pages are joined
+        # with pdfunite, so pages unchanged since the last preview or export
+        # come straight from the cache. Without pdfunite the whole document is
+        # compiled in one go. The joined PDF is cached under the key of the
+        # whole document, which is what that fallback compiles.
+        revision, key = self.compiled_pdf
+        if revision == self.revision:
+            pdf = self.compile_cache.read(key, ".pdf")
+            if pdf is not None:
+                return pdf
         try:
-            subprocess.run(["pdflatex", "-interaction=nonstopmode", "preview.tex"], check=True,
-                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        except subprocess.CalledProcessError:
-            messagebox.showerror("Error", "LaTeX compilation failed.")
+            pages = self.gather_pages()
+            tex = build_document(self.gather_latex())
+            key = self.compile_cache.key(tex)
+            pdfs = self.cached_pdfs([build_document(body) for body in pages])
+            if len(pdfs) == 1:
+                pdf = pdfs[0]
+            else:
+                pdf = unite_pdfs(pdfs)
+                if pdf is None:
+                    pdf = self.cached_pdf(tex)
+                else:
+                    self.compile_cache.put_bytes(key, ".pdf", pdf)
+        except CompileError as e:
+            messagebox.showerror("Error", str(e))
             return None
-        return "preview.pdf" if os.path.exists("preview.pdf") else None
-
-    def preview_latex(self):
+        self.compiled_pdf = (self.revision, key)
+        return pdf
+
+    def cached_pdf(self, tex, preview=False):
+        # Returns the PDF bytes; a fresh compile hands them over without rereading the cache.
+        key = self.compile_cache.key(tex)
+        pdf = self.compile_cache.read(key, ".pdf")
+        if pdf is not None:
+            return pdf
+        future = self.compile_service.submit(tex)
+        if preview:
+            self.preview_future = future
+        pdf = future.result().pdf
+        self.compile_cache.put_bytes(key, ".pdf", pdf)
+        return pdf
+
+    def cached_pdfs(self, texs):
+        # cached_pdf for many documents at once; the ones not cached compile side by side.
+        keys = [self.compile_cache.key(tex) for tex in texs]
+        pdfs, futures = {}, {}
+        for tex, key in zip(texs, keys):
+            if key in pdfs or key in futures:
+                continue
+            pdf = self.compile_cache.read(key, ".pdf")
+            if pdf is not None:
+                pdfs[key] = pdf
+            else:
+                futures[key] = self.compile_service.submit(tex)
+        # Every job is waited for, so the pages that did compile are cached
+        # before the first failure is raised.
+        error = None
+        for key, future in futures.items():
+            try:
+                pdfs[key] = future.result().pdf
+            except CompileError as e:
+                error = error or e
+                continue
+            self.compile_cache.put_bytes(key, ".pdf", pdfs[key])
+        if error is not None:
+            raise error
+        return [pdfs[key] for key in keys]
+
+    def cancel_preview_compile(self):
+        future = self.preview_future
+        if future is not None:
+            self.compile_service.cancel(future)
+
+    def preview_latex(self, edited=None):
+        # edited: (block, stand-in record) for a live preview; the block's page
+        # is built with the stand-in in its place.
         if self.code_text is not None:
             self.code_text.destroy()
             self.code_text = None
-        pdf = self.compile_latex_to_pdf(self.gather_latex())
-        if not pdf:
+        draft = self.draft_preview_var.get()
+        pages = self.gather_pages()
+        live_page, swap = None, lambda g: g
+        if edited is not None:
+            block, stand_in = edited
+            live_page = page_of(self.group_tracker.group(block))
+            swap = lambda g: [stand_in if b is block else b for b in g] if page_of(g) == live_page else g
+            pages = list(pages)
+            pages[live_page] = page_picture([put_latex(swap(g)) for g in self.get_groups() if page_of(g) == live_page])
+        if self.preview_engine_var.get() == "native":
+            page_groups = [[] for _ in pages]
+            for g in map(swap, self.get_groups()):
+                page_groups[page_of(g)].append(tuple(getattr(b, "record", b) for b in g))
+            sources = [PreviewSource("native", (body, tuple(groups)), draft) for body, groups in zip(pages, page_groups)]
+        elif self.incremental_preview_var.get():
+            fragments = [[] for _ in pages]
+            for g in map(swap, self.get_groups()):
+                page = page_of(g)
+                fragments[page].append((g[0].x, g[0].y - page * PAGE_HEIGHT, build_fragment(group_latex(g))))
+            sources = [PreviewSource("fragments", tuple(page_fragments), draft) for page_fragments in fragments]
+        else:
+            sources = [PreviewSource("pdflatex", build_document(body), draft) for body in pages]
+        # Pages whose source is unchanged keep their image.
+        for page, shown in list(self.preview_shown.items()):
+            if page >= len(sources) or sources[page] != shown[0]:
+                self.drop_preview_page(page)
+        self.preview_sources = sources
+        canvas = self.ensure_preview_canvas()
+        canvas.delete("page")
+        stride = PREVIEW_HEIGHT + PREVIEW_GAP
+        for page in range(len(sources)):
+            canvas.create_rectangle(0, page * stride, PREVIEW_WIDTH, page * stride + PREVIEW_HEIGHT,
+                                    fill="white", outline="gray", tags="page")
+        canvas.tag_lower("page")
+        canvas.config(scrollregion=(0, 0, PREVIEW_WIDTH, len(sources) * stride - PREVIEW_GAP))
+        if live_page is not None:
+            top = canvas.canvasy(0)
+            if not top - PREVIEW_HEIGHT < live_page * stride < top + canvas.winfo_height():
+                canvas.yview_moveto(live_page * stride / (len(sources) * stride - PREVIEW_GAP))
+        self.preview_started = time.perf_counter()
+        self.render_visible_pages()
+
+    def schedule_live_preview(self, block, fields):
+        # Every keystroke restarts the wait, so only a pause in typing compiles;
+        # a compile for typing that has moved on is cancelled by the preview
+        # worker and its result dropped.
+        if not self.live_preview_var.get():
+            return
+        if self.live_preview_after is not None:
+            self.root.after_cancel(self.live_preview_after)
+        self.live_preview_after = self.root.after(LIVE_PREVIEW_DELAY_MS, lambda: self.run_live_preview(block, fields))
+
+    def run_live_preview(self, block, fields):
+        self.live_preview_after = None
+        if block in self.group_tracker.group_ids:
+            self.live_previewed = True
+            self.preview_latex(edited=(block, block.record.copy(**fields)))
+
+    def end_live_preview(self):
+        # The dialog closed: show the document as saved, or as it was if cancelled.
+        if self.live_preview_after is not None:
+            self.root.after_cancel(self.live_preview_after)
+            self.live_preview_after = None
+        if self.live_previewed:
+            self.live_previewed = False
+            # After save() has applied the edit.
+            self.root.after_idle(self.preview_latex)
+
+    def schedule_preview_pages(self):
+        if not self.preview_scroll_pending:
+            self.preview_scroll_pending = True
+            self.root.after_idle(self.render_visible_pages)
+
+    def render_visible_pages(self):
+        # Pages in view are rasterized one at a time, top down, each as soon as
+        # the one before it is on screen; pages scrolled well out of view give
+        # their images up again.
+        self.preview_scroll_pending = False
+        if self.preview_canvas is None or not self.preview_sources:
+            return
+        stride = PREVIEW_HEIGHT + PREVIEW_GAP
+        top = self.preview_canvas.canvasy(0)
+        first = max(0, int(top) // stride)
+        last = min(len(self.preview_sources) - 1, int(top + self.preview_canvas.winfo_height()) // stride)
+        for page in [p for p in self.preview_shown if p < first - 1 or p > last + 1]:
+            self.drop_preview_page(page)
+        for page in range(first, last + 1):
+            source = self.preview_sources[page]
+            shown = self.preview_shown.get(page)
+            if shown is not None and shown[0] == source:
+                continue
+            if source.engine == "native":
+                # Drawn right here; no compile to wait for.
+                self.draw_native_page(page, source)
+                continue
+            if self.preview_inflight != (page, source):
+                self.preview_inflight = (page, source)
+                self.preview_status.config(text=f"Compiling page {page + 1}…")
+                self.preview_worker.submit(lambda: self.render_page(source),
+                                           lambda img: self.show_page(page, source, img),
+                                           lambda error: self.preview_failed(page, source, error))
             return
-        img = convert_from_path(pdf, first_page=1, last_page=1)[0]
-        img.thumbnail((800,1100))
-        self.preview_image = ImageTk.PhotoImage(img)
-        self.preview_canvas.delete("all")
-        self.preview_canvas.create_image((800-img.width)//2, (1100-img.height)//2,
-                                         anchor="nw", image=self.preview_image)
+        self.preview_status.config(text="")
+        self.preview_started = None
+
+    # The render_* methods run on the preview worker thread and must not touch any Tk object.
+    def render_page(self, source):
+        draft = source.draft
+        if source.engine == "fragments":
+            return self.render_fragments(source.payload, draft)
+        # Rendered directly at the preview width rather than at 200 dpi and shrunk.
+        return self.cached_image(source.payload, draft, lambda pdf: rasterize(pdf, width=PREVIEW_WIDTH, draft=draft))
+
+    def render_fragments(self, fragments, draft):
+        # One point is one preview pixel, so fragments rasterized at 72 dpi
+        # paste straight onto the page at their block coordinates.
+        from PIL import Image
+        page = Image.new("RGB", (PREVIEW_WIDTH, PREVIEW_HEIGHT), "white")
+        for x, y, tex in fragments:
+            page.paste(self.cached_image(tex, draft, lambda pdf: rasterize(pdf, dpi=72, draft=draft)), (x, y))
+        return page
+
+    def cached_image(self, tex, draft, rasterize_pdf):
+        key = self.compile_cache.key(tex)
+        suffix = ".draft.png" if draft else ".png"
+        png = self.compile_cache.read(key, suffix)
+        if png is not None:
+            from PIL import Image
+            img = Image.open(io.BytesIO(png))
+            img.load()
+            return img
+        img = rasterize_pdf(self.cached_pdf(tex, preview=True))
+        self.compile_cache.put(key, suffix, lambda path: img.save(path, "PNG"))
+        return img
+
+    def show_page(self, page, source, img):
+        from PIL import ImageTk
+        self.preview_inflight = None
+        if page < len(self.preview_sources) and self.preview_sources[page] == source:
+            self.drop_preview_page(page)
+            with PERF.span("photoimage"):
+                photo = ImageTk.PhotoImage(img)
+            top = page * (PREVIEW_HEIGHT + PREVIEW_GAP)
+            item = self.preview_canvas.create_image((PREVIEW_WIDTH-img.width)//2, top + (PREVIEW_HEIGHT-img.height)//2,
+                                                    anchor="nw", image=photo)
+            self.preview_shown[page] = (source, photo, item)
+            if self.preview_started is not None:
+                # Request to first page on screen, compile and rasterize included.
+                PERF.add("preview", (time.perf_counter() - self.preview_started) * 1000)
+                self.preview_started = None
+        self.render_visible_pages()
+
+    def draw_native_page(self, page, source):
+        with PERF.span("native_render"):
+            if self.native_metrics is None:
+                self.native_metrics = TkMetrics(self.root)
+            self.drop_preview_page(page)
+            tag = f"native{page}"
+            top = page * (PREVIEW_HEIGHT + PREVIEW_GAP) - page * PAGE_HEIGHT
+            for records in source.payload[1]:
+                draw_group(self.preview_canvas, self.native_metrics, records, records[0].x, top + records[0].y, tag)
+            self.preview_shown[page] = (source, None, tag)
+
+    def drop_preview_page(self, page):
+        shown = self.preview_shown.pop(page, None)
+        if shown is not None and shown[2] is not None:
+            self.preview_canvas.delete(shown[2])
+
+    def preview_failed(self, page, source, error):
+        self.preview_inflight = None
+        self.preview_status.config(text="")
+        # Remembered as shown, so the page is not retried until it changes.
+        self.preview_shown[page] = (source, None, None)
+        if self.live_previewed:
+            # Half-typed input often does not compile; no dialog for every pause.
+            self.preview_status.config(text=f"Page {page + 1} does not compile yet")
+        else:
+            messagebox.showerror("Error", str(error) if isinstance(error, CompileError)
+                                 else f"Preview failed:\n{str(error)}")
+        # Carry on with the other pages in view, as show_page does.
+        self.render_visible_pages()
 
     def view_code(self):
-        body = self.gather_latex()
-        tex = rf"""\documentclass[letterpaper]{{article}}
-\usepackage[paperwidth=800pt,paperheight=1100pt,margin=0pt]{{geometry}}
-\usepackage{{amsmath,anyfontsize}}
-\pagestyle{{empty}}
-\begin{{document}}
-{body}
-\end{{document}}"""
-        self.preview_canvas.delete("all")
-        self.preview_image = None
+        self.preview_worker.cancel()
+        self.preview_inflight = None
+        self.preview_sources = []
+        self.preview_shown.clear()
+        self.preview_status.config(text="")
+        tex = build_document(self.gather_latex())
+        canvas = self.ensure_preview_canvas()
+        canvas.delete("all")
+        canvas.config(scrollregion=(0, 0, PREVIEW_WIDTH, PREVIEW_HEIGHT))
+        canvas.yview_moveto(0)
         if self.code_text is not None:
             self.code_text.destroy()
         self.code_text = tk.Text(self.preview_canvas, wrap="none", font=("Courier", 10))
@@ -363,7 +840,7 @@ class LaTeXEditor:
         self.preview_canvas.create_window(0, 0, anchor="nw", window=self.code_text, width=800, height=1100)
 
     def export_pdf(self):
-        pdf = self.compile_latex_to_pdf(self.gather_latex())
+        pdf = self.compile_latex_to_pdf()
         if not pdf:
             return
         export_path = filedialog.asksaveasfilename(defaultextension=".pdf",
@@ -371,21 +848,21 @@ class LaTeXEditor:
         if not export_path:
             return
         try:
-            shutil.copyfile(pdf, export_path)
+            with open(export_path, "wb") as f:
+                f.write(pdf)
             messagebox.showinfo("Export", "PDF exported successfully.")
         except Exception as e:
             messagebox.showerror("Export Error", f"Failed to export PDF:\n{str(e)}")
 
     def propagate_font_size(self, edited_block, new_font_size):
-        groups = self.get_groups()
-        target_group = None
-        for group in groups:
-            if edited_block in group:
-                target_group = group
-                break
-        if not target_group:
+        # Every edit dialog's save() ends up here, so this also records content edits.
+        self.mark_changed()
+        if edited_block not in self.group_tracker.group_ids:
             return
+        target_group = self.group_tracker.group(edited_block)
+        # Part of the edit's undo step, so one undo restores the whole group.
         for block in target_group:
+            self.history.watch(block)
             block.font_size = new_font_size
             block.update_display()
         self.reposition_group(target_group)
@@ -393,13 +870,12 @@ class LaTeXEditor:
 
 
     def reposition_group(self, group):
-        sorted_group = sorted(group, key=lambda b: b.widget.winfo_x())
-        common_y = min(b.widget.winfo_y() for b in sorted_group)
-        x = sorted_group[0].widget.winfo_x()
+        sorted_group = sorted(group, key=lambda b: b.x)
+        common_y = min(b.y for b in sorted_group)
+        x = sorted_group[0].x
         for block in sorted_group:
-            block.widget.place(x=x, y=common_y)
-            block.widget.update_idletasks()
-            x += block.widget.winfo_width()  # no gap between blocks
+            self.place_block(block, x, common_y)
+            x += block.w  # no gap between blocks
 
 
 if __name__ == "__main__":
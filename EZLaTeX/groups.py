@@ -0,0 +1,169 @@
+from spatial import SpatialGrid
+
+# Blocks closer than this (edge to edge, and in y) belong to the same group.
+SNAP_DISTANCE = 5
+VERTICAL_THRESHOLD = 10
+ESTIMATE_SLACK = 0.4  # how far off an estimate_size() width may be, as a share of it
+
+
+# Incremental snap-group membership. Two blocks are adjacent when one's right
+# edge meets the other's left edge (the rule get_groups used to apply to every
+# pair). Adjacency is looked up in the SpatialGrid for the one block that moved,
+# merges relabel the smaller group into the larger, and edge removals only walk
+# the group that lost the edge to find out whether it split.
+class GroupTracker:
+    def __init__(self, grid, snap_distance, vertical_threshold):
+        self.grid = grid
+        self.snap_distance, self.vertical_threshold = snap_distance, vertical_threshold
+        self.neighbours = {}  # block -> set of adjacent blocks
+        self.group_ids = {}   # block -> group id
+        self.members = {}     # group id -> set of blocks
+        self.changed = set()  # group ids created, resized, moved or dropped since take_changed()
+        self._sorted = {}     # group id -> members sorted by x, until the group changes
+        self._next_id = 0
+
+    def _touch(self, *gids):
+        self.changed.update(gids)
+        for gid in gids:
+            self._sorted.pop(gid, None)
+
+    def _new_group(self, blocks):
+        gid = self._next_id
+        self._next_id += 1
+        self.members[gid] = set(blocks)
+        for b in blocks:
+            self.group_ids[b] = gid
+        self._touch(gid)
+        return gid
+
+    def _adjacent(self, block):
+        x, y, w, _ = self.grid.bounds[block]
+        found = set(self.grid.near_left_edges(x + w, y, self.snap_distance, self.vertical_threshold))
+        found.update(self.grid.near_right_edges(x, y, self.snap_distance, self.vertical_threshold))
+        found.discard(block)
+        return found
+
+    def update(self, block):
+        # Call after the block has been (re)inserted into the grid.
+        if block not in self.group_ids:
+            self.neighbours[block] = set()
+            self._new_group([block])
+        self._touch(self.group_ids[block])
+        old = self.neighbours[block]
+        new = self._adjacent(block)
+        lost, gained = old - new, new - old
+        # Drop edges and settle any split before joining new neighbours, so the
+        # flood fill in _split never walks into another group.
+        for other in lost:
+            self.neighbours[other].discard(block)
+        old -= lost
+        if lost:
+            self._split(self.group_ids[block], [block, *lost])
+        for other in gained:
+            self.neighbours[other].add(block)
+            old.add(other)
+            self._union(block, other)
+
+    def remove(self, block):
+        if block not in self.group_ids:
+            return
+        lost = self.neighbours.pop(block)
+        for other in lost:
+            self.neighbours[other].discard(block)
+        gid = self.group_ids.pop(block)
+        self.members[gid].discard(block)
+        self._touch(gid)
+        if not self.members[gid]:
+            del self.members[gid]
+        elif lost:
+            self._split(gid, list(lost))
+
+    def clear(self):
+        self._touch(*self.members)
+        self.neighbours.clear()
+        self.group_ids.clear()
+        self.members.clear()
+
+    def _union(self, a, b):
+        ga, gb = self.group_ids[a], self.group_ids[b]
+        if ga == gb:
+            return
+        if len(self.members[ga]) < len(self.members[gb]):
+            ga, gb = gb, ga
+        moved = self.members.pop(gb)
+        for blk in moved:
+            self.group_ids[blk] = ga
+        self.members[ga] |= moved
+        self._touch(ga, gb)
+
+    def _component(self, start):
+        seen = {start}
+        stack = [start]
+        while stack:
+            for other in self.neighbours[stack.pop()]:
+                if other not in seen:
+                    seen.add(other)
+                    stack.append(other)
+        return seen
+
+    def _split(self, gid, seeds):
+        # Every member is still connected to at least one seed, so flood-filling
+        # from the seeds partitions the old group. The first part keeps the id.
+        remaining = set(self.members[gid])
+        first = True
+        for seed in seeds:
+            if seed not in remaining:
+                continue
+            part = self._component(seed)
+            remaining -= part
+            if first:
+                if not remaining:
+                    return
+                self.members[gid] = part
+                first = False
+            else:
+                self._new_group(part)
+        self._touch(gid)
+
+    def group(self, block):
+        return list(self._sorted_members(self.group_ids[block]))
+
+    def groups(self):
+        # The lists are shared with the tracker's cache; callers must not modify them.
+        return [self._sorted_members(gid) for gid in self.members]
+
+    def _sorted_members(self, gid):
+        members = self._sorted.get(gid)
+        if members is None:
+            members = self._sorted[gid] = sorted(self.members[gid], key=lambda b: b.x)
+        return members
+
+    def take_changed(self):
+        changed, self.changed = self.changed, set()
+        return changed
+
+
+def fit_estimated(blocks, estimated):
+    # Blocks saved without a size (version 1 files) only get estimate_size()
+    # widths, too rough for SNAP_DISTANCE. One whose estimated right edge lands
+    # near the left edge of a block on its row was snapped to it when it was
+    # saved, so it takes the width that meets that edge exactly.
+    grid = SpatialGrid(2 * SNAP_DISTANCE, VERTICAL_THRESHOLD)
+    for b in blocks:
+        grid.insert(b, b.x, b.y, b.w, b.h)
+    for b in estimated:
+        right = b.x + b.w
+        reach = max(SNAP_DISTANCE, b.w * ESTIMATE_SLACK)
+        nearest = min((o for o in grid.near_left_edges(right, b.y, reach, VERTICAL_THRESHOLD) if o.x > b.x),
+                      key=lambda o: (abs(o.x - right), grid.order[o]), default=None)
+        if nearest is not None:
+            b.w = nearest.x - b.x
+
+
+def build_groups(blocks):
+    # One-shot grouping for headless callers: blocks need x, y, w and h.
+    tracker = GroupTracker(SpatialGrid(2 * SNAP_DISTANCE, VERTICAL_THRESHOLD), SNAP_DISTANCE, VERTICAL_THRESHOLD)
+    for b in blocks:
+        tracker.grid.insert(b, b.x, b.y, b.w, b.h)
+        tracker.update(b)
+    return tracker.groups()
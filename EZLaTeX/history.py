@@ -0,0 +1,125 @@
+import sys
+from collections import deque
+
+HISTORY_MAX_BYTES = 4 * 1024 * 1024
+STEP_COST = 200    # rough bytes per step and per block entry, on top of the values
+REMOVED_COST = 1000  # a removed block is kept alive by the step that removed it
+
+
+# Undo/redo over small deltas. A step is opened with begin(), every block about
+# to change is passed to watch() (only its first state in the step is kept),
+# and end() stores just the fields that actually differ, plus the blocks the
+# step added or removed. Whole-document snapshots are never taken.
+#
+# Undo and redo drive a target with add_block(block), remove_block(block) and
+# set_fields(block, values). Blocks are anything with a record whose
+# columns() name its fields (the editor's Block views).
+class Step:
+    __slots__ = ("label", "changes", "added", "removed", "cost")
+
+    def __init__(self, label, changes, added, removed):
+        self.label = label
+        self.changes = changes  # block -> (fields before, fields after), changed fields only
+        self.added, self.removed = added, removed
+        self.cost = STEP_COST + REMOVED_COST * len(removed) + sum(
+            STEP_COST + sum(sys.getsizeof(v) for v in before.values()) * 2
+            for before, _ in changes.values())
+
+
+def snapshot(block):
+    record = block.record
+    return {name: getattr(record, name) for name in record.columns()}
+
+
+class UndoHistory:
+    def __init__(self, max_bytes=HISTORY_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.undo_steps, self.redo_steps = deque(), []
+        self.size = 0
+        self.label = None
+        self.watched = None  # block -> fields at the start of the open step
+        self.added, self.removed = [], []
+
+    def begin(self, label):
+        # Steps do not nest; a step left open (e.g. a release event that never
+        # arrived) is closed first.
+        if self.watched is not None:
+            self.end()
+        self.label, self.watched = label, {}
+        self.added, self.removed = [], []
+
+    def watch(self, block):
+        if self.watched is not None and block not in self.watched:
+            self.watched[block] = snapshot(block)
+
+    def block_added(self, block):
+        if self.watched is not None:
+            self.added.append(block)
+
+    def block_removed(self, block):
+        if self.watched is not None:
+            self.removed.append(block)
+
+    def end(self):
+        if self.watched is None:
+            return
+        changes = {}
+        for block, before in self.watched.items():
+            after = snapshot(block)
+            diff = {name: value for name, value in before.items() if after[name] != value}
+            if diff:
+                changes[block] = (diff, {name: after[name] for name in diff})
+        added = [b for b in self.added if b not in self.removed]
+        removed = [b for b in self.removed if b not in self.added]
+        self.watched = None
+        if changes or added or removed:
+            self.push(Step(self.label, changes, added, removed))
+
+    def push(self, step):
+        self.undo_steps.append(step)
+        self.size += step.cost
+        self.redo_steps.clear()
+        while self.size > self.max_bytes and len(self.undo_steps) > 1:
+            self.size -= self.undo_steps.popleft().cost
+
+    def clear(self):
+        self.undo_steps.clear()
+        self.redo_steps.clear()
+        self.size = 0
+        self.watched = None
+
+    def can_undo(self):
+        return bool(self.undo_steps)
+
+    def can_redo(self):
+        return bool(self.redo_steps)
+
+    def undo(self, target):
+        self.end()
+        if not self.undo_steps:
+            return None
+        step = self.undo_steps.pop()
+        self.size -= step.cost
+        for block in step.added:
+            target.remove_block(block)
+        for block in step.removed:
+            target.add_block(block)
+        for block, (before, _) in step.changes.items():
+            target.set_fields(block, before)
+        self.redo_steps.append(step)
+        return step.label
+
+    def redo(self, target):
+        self.end()
+        if not self.redo_steps:
+            return None
+        step = self.redo_steps.pop()
+        for block, (_, after) in step.changes.items():
+            target.set_fields(block, after)
+        for block in step.removed:
+            target.remove_block(block)
+        for block in step.added:
+            target.add_block(block)
+        self.undo_steps.append(step)
+        self.size += step.cost
+        return step.label
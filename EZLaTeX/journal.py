@@ -0,0 +1,220 @@
+import glob
+import json
+import os
+import threading
+import uuid
+
+from serializer import encode_json, header, iter_records, record_decoders, record_row, save_records
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+JOURNAL_DIR = os.path.join(os.path.expanduser("~"), ".eztex", "journal")
+COMPACT_AFTER = 5000  # journal lines before the next checkpoint
+FORMAT = "eztex-journal"
+VERSION = 1
+
+
+def claim(path):
+    # Opens path and takes a non-blocking exclusive lock on it. Returns the
+    # open file, which holds the lock until closed, or None when another
+    # instance holds it. The OS drops the lock when its owner dies.
+    f = open(path, "a+b")
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# Crash-recovery journal for the open document. Every running editor keeps
+# its own files in JOURNAL_DIR, named after the instance:
+#
+#     <name>.lock             locked for as long as the instance runs
+#     <name>.log              header, then one line per change:
+#                                 ["put", id, kind, *columns]   block added or changed
+#                                 ["del", id]                   block deleted
+#     <name>-<gen>.eztex      the document as of the log's generation
+#
+# Each flush appends one line per block touched since the previous flush, so an
+# edit costs the same however large the document is; the fsync that makes it
+# durable runs on a background thread. Every COMPACT_AFTER lines (and on
+# open/save) the document is written out as a new checkpoint and the log
+# restarts. The log header names its generation, so a crash part-way through
+# compaction still pairs the log with the checkpoint it was written against.
+# A log whose lock nobody holds was left by a session that did not finish:
+# that is work to recover. Logs of instances still running are left alone.
+class Journal:
+    def __init__(self, directory=JOURNAL_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.name = uuid.uuid4().hex[:12]
+        self.log_path = os.path.join(directory, f"{self.name}.log")
+        self.lock = claim(os.path.join(directory, f"{self.name}.lock"))
+        self.orphan = None  # (name, lock) of the dead instance's journal pending() found
+        self.f = None
+        self.generation = 0
+        self.ids = {}  # block -> id used in the log
+        self.next_id = 0
+        self.dirty, self.deleted = set(), []
+        self.lines = 0
+        self.sync_wanted = threading.Event()
+        self.sync_lock = threading.Lock()  # held while fsyncing, so the log is not closed under it
+        self.syncer = None
+
+    def checkpoint_path(self, generation, name=None):
+        return os.path.join(self.directory, f"{name or self.name}-{generation}.eztex")
+
+    def pending(self):
+        # Looks for a journal whose owner is gone and claims it for recover().
+        if self.orphan is not None:
+            return True
+        for log_path in sorted(glob.glob(os.path.join(self.directory, "*.log"))):
+            name = os.path.splitext(os.path.basename(log_path))[0]
+            if name == self.name:
+                continue
+            lock = claim(os.path.join(self.directory, f"{name}.lock"))
+            if lock is not None:
+                self.orphan = (name, lock)
+                return True
+        return False
+
+    def recover(self):
+        # Returns (records, document path) rebuilt from the claimed journal's checkpoint and log.
+        name = self.orphan[0]
+        with open(os.path.join(self.directory, f"{name}.log"), "r", encoding="utf-8") as f:
+            head = json.loads(f.readline())
+            checkpoint = self.checkpoint_path(head["generation"], name)
+            records = {}
+            if os.path.exists(checkpoint):
+                with open(checkpoint, "r", encoding="utf-8") as cf:
+                    records = dict(enumerate(iter_records(cf)))
+            decoders = record_decoders(head["fields"])
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # torn last write
+                if entry[0] == "put":
+                    decode = decoders.get(entry[2])
+                    if decode is not None:
+                        records[entry[1]] = decode(entry[3:])
+                elif entry[0] == "del":
+                    records.pop(entry[1], None)
+        return list(records.values()), head.get("file")
+
+    def discard_orphan(self):
+        # Once recovered (into this instance's own journal) or declined.
+        if self.orphan is None:
+            return
+        name, lock = self.orphan
+        self.orphan = None
+        remove_files([os.path.join(self.directory, f"{name}.log"),
+                      *glob.glob(os.path.join(self.directory, f"{name}-*.eztex"))])
+        lock.close()
+        remove_files([os.path.join(self.directory, f"{name}.lock")])
+
+    def start(self, blocks, file=None):
+        # Compaction: checkpoint the whole document and begin a new log.
+        self.close_log()
+        generation = self.generation + 1
+        blocks = list(blocks)
+        save_records(self.checkpoint_path(generation), (b.record for b in blocks))
+        tmp = os.path.join(self.directory, f".{uuid.uuid4().hex}.tmp")
+        with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+            f.write(encode_json({"format": FORMAT, "version": VERSION, "generation": generation,
+                                 "file": file, "fields": header()["fields"]}) + "\n")
+        os.replace(tmp, self.log_path)
+        self.generation = generation
+        remove_files(path for path in glob.glob(os.path.join(self.directory, f"{self.name}-*.eztex"))
+                     if path != self.checkpoint_path(generation))
+        self.ids = {b: i for i, b in enumerate(blocks)}
+        self.next_id = len(blocks)
+        self.dirty.clear()
+        self.deleted.clear()
+        self.lines = 0
+        self.f = open(self.log_path, "a", encoding="utf-8", newline="\n")
+        if self.syncer is None:
+            self.syncer = threading.Thread(target=self.sync_loop, name="journal-sync", daemon=True)
+            self.syncer.start()
+
+    def touch(self, block):
+        self.dirty.add(block)
+
+    def removed(self, block):
+        self.dirty.discard(block)
+        block_id = self.ids.pop(block, None)
+        if block_id is not None:
+            self.deleted.append(block_id)
+
+    def flush(self):
+        # Hands the lines to the OS; sync_loop makes them durable off the UI thread.
+        if self.f is None or not (self.dirty or self.deleted):
+            return
+        lines = [encode_json(["del", block_id]) for block_id in self.deleted]
+        for block in self.dirty:
+            block_id = self.ids.get(block)
+            if block_id is None:
+                block_id = self.ids[block] = self.next_id
+                self.next_id += 1
+            lines.append(encode_json(["put", block_id, *record_row(block.record)]))
+        self.dirty.clear()
+        self.deleted.clear()
+        self.f.write("\n".join(lines) + "\n")
+        self.f.flush()
+        self.lines += len(lines)
+        self.sync_wanted.set()
+
+    def sync_loop(self):
+        # Flushes that arrive while an fsync is running share the next one.
+        while True:
+            self.sync_wanted.wait()
+            self.sync_wanted.clear()
+            with self.sync_lock:
+                if self.lock is None:
+                    return
+                if self.f is not None:
+                    try:
+                        os.fsync(self.f.fileno())
+                    except OSError:
+                        pass
+
+    def needs_compaction(self):
+        return self.lines >= COMPACT_AFTER
+
+    def close_log(self):
+        with self.sync_lock:
+            if self.f is not None:
+                self.f.close()
+                self.f = None
+
+    def close(self):
+        # Stops journaling but leaves the files, for the next instance to recover.
+        self.close_log()
+        with self.sync_lock:
+            if self.lock is not None:
+                self.lock.close()
+                self.lock = None
+        self.sync_wanted.set()
+
+    def finish(self):
+        # Nothing left to recover: drop this instance's log, checkpoint and lock.
+        self.close_log()
+        remove_files([self.log_path, *glob.glob(os.path.join(self.directory, f"{self.name}-*.eztex"))])
+        self.close()
+        remove_files([os.path.join(self.directory, f"{self.name}.lock")])
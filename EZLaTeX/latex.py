@@ -0,0 +1,150 @@
+# LaTeX generation shared by the Tk blocks, the editor and the headless tools.
+# Nothing in here may depend on Tk.
+
+# A document is a column of pages on the editor canvas; each page is one picture.
+PAGE_WIDTH, PAGE_HEIGHT = 800, 1100
+
+def sized(font_size, body):
+    return rf"{{\fontsize{{{font_size}pt}}{{{font_size+2}pt}}\selectfont \!\ {body}}}"
+
+
+def exponent_latex(base, exponent, font_size):
+    return sized(font_size, rf"{base}^{{{exponent}}}")
+
+
+def fraction_latex(numerator, denominator, font_size):
+    return sized(font_size, rf"\frac{{{numerator}}}{{{denominator}}}")
+
+
+def nthroot_latex(radicand, degree, font_size):
+    # Format: \sqrt[degree]{radicand}
+    return sized(font_size, rf"\sqrt[{degree}]{{{radicand}}}")
+
+
+def operation_latex(operation, font_size, log_base="10", log_argument="", lower_limit="i=1", upper_limit="n"):
+    op_lower = operation.lower()
+    if op_lower == "x":
+        return sized(font_size, r"\cdot")
+    elif operation == "/":
+        return ""
+    elif operation == "(":
+        # Return raw commands without font size or math mode delimiters.
+        return r"\left("
+    elif operation == ")":
+        return r"\right)"
+    elif op_lower == "log":
+        # If no argument, output just the function name (with optional subscript if base != "10")
+        name = r"\log" if log_base == "10" else rf"\log_{{{log_base}}}"
+        if log_argument:
+            return sized(font_size, rf"{name}\left({log_argument}\right)")
+        return sized(font_size, name)
+    elif op_lower == "ln":
+        if log_argument:
+            return sized(font_size, rf"\ln\left({log_argument}\right)")
+        return sized(font_size, r"\ln")
+    elif operation == "∑":
+        return sized(font_size, rf"\sum_{{{lower_limit}}}^{{{upper_limit}}}")
+    elif operation == "∏":
+        return sized(font_size, r"\prod")
+    elif operation == "∫":
+        return sized(font_size, r"\int")
+    else:
+        return sized(font_size, operation)
+
+
+def group_latex(sorted_group):
+    first_block = sorted_group[0]
+    # Simply concatenate the raw LaTeX from each block.
+    combined_expr = "".join(b.get_latex().strip() for b in sorted_group)
+    # Wrap the entire expression in one math mode and font size command.
+    return rf"\fontsize{{{first_block.font_size}pt}}{{{first_block.font_size+2}pt}}\selectfont ${combined_expr}$"
+
+
+def page_of(sorted_group):
+    # A group belongs to the page its first block is anchored on.
+    return max(0, int(sorted_group[0].y) // PAGE_HEIGHT)
+
+
+def put_latex(sorted_group):
+    first_block = sorted_group[0]
+    x = first_block.x
+    y_inv = PAGE_HEIGHT - (first_block.y - page_of(sorted_group) * PAGE_HEIGHT)
+    return fr"\put({x},{y_inv}){{\makebox(0,0)[lt]{{{group_latex(sorted_group)}}}}}"
+
+
+PICTURE_BEGIN = (r"\setlength{\unitlength}{1pt}", rf"\begin{{picture}}({PAGE_WIDTH},{PAGE_HEIGHT})")
+PICTURE_END = (r"\end{picture}",)
+EMPTY_PAGE = r"\mbox{}"
+PAGE_BREAK = "\n\\newpage\n"
+
+
+def page_picture(lines):
+    return "\n".join(PICTURE_BEGIN + tuple(lines) + PICTURE_END) if lines else EMPTY_PAGE
+
+
+def paged_lines(groups, line):
+    # One list of line(group) per page, up to the last page with anything on it.
+    pages = [[]]
+    for group in groups:
+        page = page_of(group)
+        while len(pages) <= page:
+            pages.append([])
+        pages[page].append(line(group))
+    return pages
+
+
+def picture_pages(groups):
+    # groups: lists of blocks (anything with x, y, font_size and get_latex()).
+    # Returns the body of every page, each compiled as a document of its own.
+    groups = [sorted(group, key=lambda blk: blk.x) for group in groups]
+    return [page_picture(lines) for lines in paged_lines(groups, put_latex)]
+
+
+def picture_latex(groups):
+    # The whole document in one body, pages separated by \newpage.
+    return PAGE_BREAK.join(picture_pages(groups))
+
+
+# picture_pages for a document that is regenerated over and over. Each group's
+# \put line is remembered under its anchor, font size and member fragments;
+# block fragments are memoized, so for an unchanged group building the key is
+# mostly identity compares. A page's picture is reused while none of its lines
+# changed, so an edit on one page leaves every other page's text (and with it
+# its compile cache key) as it was.
+class PictureCache:
+    def __init__(self):
+        self.lines = {}
+        self.page_text = {}  # tuple of a page's lines -> its picture
+        self.last = ((), EMPTY_PAGE)
+
+    def pages(self, groups):
+        # groups: lists already sorted by x, as GroupTracker.groups() returns them.
+        lines = {}
+
+        def line(group):
+            first_block = group[0]
+            key = (first_block.x, first_block.y, first_block.font_size, *[b.get_latex() for b in group])
+            text = self.lines.get(key)
+            if text is None:
+                text = put_latex(group)
+            lines[key] = text
+            return text
+
+        page_text, pages = {}, []
+        for page_lines in paged_lines(groups, line):
+            page_lines = tuple(page_lines)
+            text = self.page_text.get(page_lines)
+            if text is None:
+                text = page_picture(page_lines)
+            page_text[page_lines] = text
+            pages.append(text)
+        self.lines, self.page_text = lines, page_text  # forget groups and pages that are gone
+        return tuple(pages)
+
+    def joined(self, pages):
+        if pages != self.last[0]:
+            self.last = (pages, PAGE_BREAK.join(pages))
+        return self.last[1]
+
+    def picture(self, groups):
+        return self.joined(self.pages(groups))
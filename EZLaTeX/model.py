@@ -0,0 +1,148 @@
+# Tk-free document model. Every block is a small __slots__ record holding its
+# geometry, font size and content; the classes in blocks/ are Tk views over one
+# of these, and headless tools work on the records directly.
+from latex import exponent_latex, fraction_latex, nthroot_latex, operation_latex
+
+# Size of a record that has never been laid out by Tk: a rough Helvetica
+# estimate (average glyph ~0.6em) plus the label's padding and border.
+LABEL_PADDING = 18
+
+# Only assigning these keeps the memoized LaTeX fragment; __setattr__ clears
+# _latex when any other slot (font size or content) is set.
+LAYOUT_SLOTS = frozenset(("x", "y", "w", "h", "_latex"))
+COMMON_FIELDS = ("x", "y", "w", "h", "font_size")
+
+
+class BlockRecord:
+    __slots__ = ("x", "y", "w", "h", "font_size", "_latex")
+    kind = None
+    fields = ()  # content fields, in constructor order
+
+    def __init__(self, font_size=10, x=0, y=0, w=0, h=0):
+        self.x, self.y, self.w, self.h, self.font_size = x, y, w, h, font_size
+
+    def __setattr__(self, name, value):
+        if name not in LAYOUT_SLOTS:
+            object.__setattr__(self, "_latex", None)
+        object.__setattr__(self, name, value)
+
+    @classmethod
+    def columns(cls):
+        return COMMON_FIELDS + cls.fields
+
+    @classmethod
+    def from_columns(cls, values):
+        # Bulk constructor for loaders: values in columns() order, stored
+        # straight into the slots.
+        record = cls.__new__(cls)
+        set_slot = object.__setattr__
+        set_slot(record, "_latex", None)
+        for name, value in zip(cls.columns(), values):
+            set_slot(record, name, value)
+        return record
+
+    def to_latex(self):
+        return ""
+
+    def get_latex(self):
+        # Memoized to_latex(); the name latex.group_latex/picture_latex and the Tk blocks use.
+        latex = self._latex
+        if latex is None:
+            latex = self._latex = self.to_latex()
+        return latex
+
+    def copy(self, **changes):
+        # A detached copy with some fields changed, e.g. to preview an edit
+        # before it is applied.
+        record = self.from_columns([getattr(self, name) for name in self.columns()])
+        for name, value in changes.items():
+            setattr(record, name, value)
+        return record
+
+    def display_text(self):
+        return ""
+
+    def estimate_size(self):
+        self.w = int(len(self.display_text()) * self.font_size * 0.6) + LABEL_PADDING
+        self.h = int(self.font_size * 1.2) + LABEL_PADDING
+
+
+class ExponentRecord(BlockRecord):
+    __slots__ = ("base", "exponent")
+    kind = "exponent"
+    fields = ("base", "exponent")
+
+    def __init__(self, base="x", exponent="2", font_size=10, **geometry):
+        super().__init__(font_size, **geometry)
+        self.base, self.exponent = base, exponent
+
+    def to_latex(self):
+        return exponent_latex(self.base, self.exponent, self.font_size)
+
+    def display_text(self):
+        return f"{self.base}^{self.exponent}"
+
+
+class FractionRecord(BlockRecord):
+    __slots__ = ("numerator", "denominator")
+    kind = "fraction"
+    fields = ("numerator", "denominator")
+
+    def __init__(self, numerator="1", denominator="2", font_size=10, **geometry):
+        super().__init__(font_size, **geometry)
+        self.numerator, self.denominator = numerator, denominator
+
+    def to_latex(self):
+        return fraction_latex(self.numerator, self.denominator, self.font_size)
+
+    def display_text(self):
+        return f"{self.numerator}/{self.denominator}"
+
+
+class NthRootRecord(BlockRecord):
+    __slots__ = ("radicand", "degree")
+    kind = "nthroot"
+    fields = ("radicand", "degree")
+
+    def __init__(self, radicand="x", degree="2", font_size=10, **geometry):
+        super().__init__(font_size, **geometry)
+        self.radicand, self.degree = radicand, degree
+
+    def to_latex(self):
+        return nthroot_latex(self.radicand, self.degree, self.font_size)
+
+    def display_text(self):
+        return f"√[{self.degree}]{{{self.radicand}}}"
+
+
+class OperationRecord(BlockRecord):
+    # The log/ln and ∑ parameters exist on every operation so no caller needs
+    # getattr defaults; they only affect the operators that use them.
+    __slots__ = ("operation", "log_base", "log_argument", "lower_limit", "upper_limit")
+    kind = "operation"
+    fields = ("operation", "log_base", "log_argument", "lower_limit", "upper_limit")
+
+    def __init__(self, operation="+", log_base="10", log_argument="", lower_limit="i=1", upper_limit="n",
+                 font_size=10, **geometry):
+        super().__init__(font_size, **geometry)
+        self.operation = operation  # fixed at creation time
+        self.log_base, self.log_argument = log_base, log_argument
+        self.lower_limit, self.upper_limit = lower_limit, upper_limit
+
+    def to_latex(self):
+        return operation_latex(self.operation, self.font_size, self.log_base, self.log_argument,
+                               self.lower_limit, self.upper_limit)
+
+    def display_text(self):
+        op_lower = self.operation.lower()
+        if op_lower == "x":
+            return "·"
+        elif op_lower in ["log", "ln"] and self.log_argument:
+            # Show "log" or "ln" with the argument if provided.
+            if op_lower == "log" and self.log_base != "10":
+                return f"log₍{self.log_base}₎({self.log_argument})"
+            return f"{self.operation}({self.log_argument})"
+        return self.operation
+
+
+RECORD_TYPES = {cls.kind: cls for cls in (ExponentRecord, FractionRecord, OperationRecord, NthRootRecord)}
@@ -0,0 +1,234 @@
+import re
+
+# Draft preview engine: lays snap groups out straight from their records, the
+# way the LaTeX they generate would typeset, and draws them on a canvas in
+# milliseconds without starting pdflatex. It covers what EzTeX emits (scripts,
+# \frac, \sqrt[], \sum_{}^{}, \prod, \int, \log_{}, \ln, \left( \right) and
+# \cdot); field text is set as typed, with a few common commands mapped to
+# their symbols. Export always goes through pdflatex.
+#
+# The layout is Tk-free: it asks a metrics object for text widths, ascents
+# and descents (TkMetrics on screen, ApproxMetrics in the benchmark) and
+# produces drawing items relative to the group's baseline:
+#
+#     ("text", x, baseline_y, text, size, italic)
+#     ("line", x0, y0, x1, y1, width)
+
+SCRIPT = 0.7       # sub/superscripts and fraction parts, relative to the base size
+DEGREE = 0.5       # the degree of a root
+BIG_OP = 1.3       # ∑, ∏ and ∫
+SUP_RAISE = 0.45   # baseline shifts in ems
+SUB_DROP = 0.25
+AXIS = 0.25        # fraction bar height above the baseline, in ems
+BLOCK_SPACE = 1 / 6  # the \!\ every block's LaTeX starts with, net
+BINARY_SPACE = 0.22  # medium space either side of + - = ·
+SERIF = "Times"
+
+SYMBOLS = {r"\alpha": "α", r"\beta": "β", r"\gamma": "γ", r"\delta": "δ", r"\epsilon": "ε", r"\theta": "θ",
+           r"\lambda": "λ", r"\mu": "μ", r"\pi": "π", r"\sigma": "σ", r"\phi": "φ", r"\omega": "ω",
+           r"\Delta": "Δ", r"\Sigma": "Σ", r"\Omega": "Ω", r"\infty": "∞", r"\cdot": "·", r"\times": "×",
+           r"\pm": "±", r"\leq": "≤", r"\geq": "≥", r"\neq": "≠", r"\to": "→"}
+_command = re.compile(r"\\[A-Za-z]+")
+_runs = re.compile(r"[A-Za-z]+|[^A-Za-z]+")
+
+
+def plain(tex):
+    text = _command.sub(lambda m: SYMBOLS.get(m.group(0), m.group(0)[1:]), tex)
+    return text.replace("{", "").replace("}", "")
+
+
+class Box:
+    __slots__ = ("width", "ascent", "descent", "items")
+
+    def __init__(self, width=0.0, ascent=0.0, descent=0.0, items=()):
+        self.width, self.ascent, self.descent = width, ascent, descent
+        self.items = list(items)
+
+    def add(self, box, dx, dy=0.0):
+        # Places box with its baseline-left at (dx, dy) of this one; y grows downwards.
+        for item in box.items:
+            if item[0] == "text":
+                self.items.append(("text", item[1] + dx, item[2] + dy) + item[3:])
+            else:
+                self.items.append(("line", item[1] + dx, item[2] + dy, item[3] + dx, item[4] + dy, item[5]))
+        self.width = max(self.width, dx + box.width)
+        self.ascent = max(self.ascent, box.ascent - dy)
+        self.descent = max(self.descent, box.descent + dy)
+
+
+def hbox(boxes, space=0.0):
+    row = Box()
+    for box in boxes:
+        row.add(box, row.width + space if row.items else row.width)
+    return row
+
+
+def text_box(metrics, text, size, italic=False):
+    return Box(metrics.width(text, size, italic), metrics.ascent(size), metrics.descent(size),
+               [("text", 0.0, 0.0, text, size, italic)] if text else [])
+
+
+def math_box(metrics, tex, size):
+    # Letters in math italic, everything else upright, as TeX sets them.
+    text = plain(tex)
+    return hbox([text_box(metrics, run, size, run[0].isalpha() and run.isascii()) for run in _runs.findall(text)])
+
+
+def scripts(metrics, nucleus, size, sup=None, sub=None):
+    box = Box()
+    box.add(nucleus, 0)
+    if sup:
+        box.add(math_box(metrics, sup, size * SCRIPT), nucleus.width + size * 0.05, -size * SUP_RAISE)
+    if sub:
+        box.add(math_box(metrics, sub, size * SCRIPT), nucleus.width + size * 0.05, size * SUB_DROP)
+    return box
+
+
+def fraction(metrics, numerator, denominator, size):
+    top, bottom = math_box(metrics, numerator, size * SCRIPT), math_box(metrics, denominator, size * SCRIPT)
+    width = max(top.width, bottom.width) + size * 0.2
+    axis, gap = -size * AXIS, size * 0.12
+    box = Box(width)
+    box.add(top, (width - top.width) / 2, axis - gap - top.descent)
+    box.add(bottom, (width - bottom.width) / 2, axis + gap + bottom.ascent)
+    box.items.append(("line", 0.0, axis, width, axis, max(1.0, size / 20)))
+    return box
+
+
+def root(metrics, radicand, degree, size):
+    body = math_box(metrics, radicand, size)
+    index = math_box(metrics, degree, size * DEGREE)
+    top, bottom = -body.ascent - size * 0.12, body.descent
+    rule = max(1.0, size / 20)
+    tick = max(index.width, size * 0.25)
+    left = tick + size * 0.15
+    box = Box()
+    box.add(index, tick - index.width, -size * 0.35)
+    box.items += [("line", tick - size * 0.15, -size * 0.2, tick, -size * 0.25, rule),
+                  ("line", tick, -size * 0.25, tick + size * 0.1, bottom, rule),
+                  ("line", tick + size * 0.1, bottom, left, top, rule),
+                  ("line", left, top, left + body.width + size * 0.1, top, rule)]
+    box.add(body, left + size * 0.05)
+    box.ascent = max(box.ascent, -top + rule)
+    return box
+
+
+def operation(metrics, record, size):
+    op = record.operation
+    op_lower = op.lower()
+    if op_lower in ("x", "+", "-", "="):
+        symbol = {"x": "·", "-": "−"}.get(op_lower, op)
+        return hbox([Box(size * BINARY_SPACE), text_box(metrics, symbol, size), Box(size * BINARY_SPACE)])
+    if op == "/":
+        return Box()
+    if op_lower in ("log", "ln"):
+        name = text_box(metrics, op_lower, size)
+        if op_lower == "log" and record.log_base != "10":
+            name = scripts(metrics, name, size, sub=record.log_base)
+        if not record.log_argument:
+            return name
+        argument = math_box(metrics, record.log_argument, size)
+        return hbox([name, delimiter(metrics, "(", argument, size), argument, delimiter(metrics, ")", argument, size)])
+    if op in ("∑", "∏", "∫"):
+        symbol = text_box(metrics, op, size * BIG_OP)
+        if op == "∑":
+            return scripts(metrics, symbol, size, sup=record.upper_limit, sub=record.lower_limit)
+        return symbol
+    return math_box(metrics, op, size)
+
+
+def delimiter(metrics, char, content, size):
+    # \left( and \right) grow with what they enclose.
+    height = max(content.ascent + content.descent, metrics.ascent(size) + metrics.descent(size))
+    scale = height / (metrics.ascent(size) + metrics.descent(size))
+    box = text_box(metrics, char, size * scale)
+    # Centred on the content rather than sitting on the baseline.
+    shift = ((content.descent - content.ascent) - (box.descent - box.ascent)) / 2
+    centred = Box()
+    centred.add(box, 0, shift)
+    return centred
+
+
+def block_box(metrics, record):
+    size = record.font_size
+    if record.kind == "exponent":
+        return scripts(metrics, math_box(metrics, record.base, size), size, sup=record.exponent)
+    if record.kind == "fraction":
+        return fraction(metrics, record.numerator, record.denominator, size)
+    if record.kind == "nthroot":
+        return root(metrics, record.radicand, record.degree, size)
+    return operation(metrics, record, size)
+
+
+def group_box(metrics, records):
+    # records: one snap group sorted by x. Parentheses are sized to the rest
+    # of the group once it has been laid out.
+    boxes = [None if r.kind == "operation" and r.operation in ("(", ")") else block_box(metrics, r)
+             for r in records]
+    content = hbox([b for b in boxes if b is not None])
+    size = records[0].font_size
+    row = Box()
+    for record, box in zip(records, boxes):
+        if box is None:
+            box = delimiter(metrics, record.operation, content, size)
+        else:
+            row.width += record.font_size * BLOCK_SPACE
+        row.add(box, row.width)
+    return row
+
+
+class ApproxMetrics:
+    # Character-count metrics for laying out without a display (benchmarks).
+    def width(self, text, size, italic=False):
+        return len(text) * size * 0.5
+
+    def ascent(self, size):
+        return size * 0.75
+
+    def descent(self, size):
+        return size * 0.25
+
+
+class TkMetrics:
+    # Real serif metrics from Tk, one font object per pixel size and slant.
+    def __init__(self, root):
+        self.root = root
+        self.fonts = {}
+        self.widths = {}
+
+    def font(self, size, italic=False):
+        key = (max(1, round(size)), italic)
+        font = self.fonts.get(key)
+        if font is None:
+            from tkinter import font as tkfont
+            font = self.fonts[key] = tkfont.Font(root=self.root, family=SERIF, size=-key[0],
+                                                 slant="italic" if italic else "roman")
+            font.ascent, font.descent = font.metrics("ascent"), font.metrics("descent")
+        return font
+
+    def width(self, text, size, italic=False):
+        key = (text, round(size), italic)
+        width = self.widths.get(key)
+        if width is None:
+            width = self.widths[key] = self.font(size, italic).measure(text)
+        return width
+
+    def ascent(self, size):
+        return self.font(size).ascent
+
+    def descent(self, size):
+        return self.font(size).descent
+
+
+def draw_group(canvas, metrics, records, x, y, tags):
+    # (x, y) is the top-left corner, as \put with \makebox[lt] anchors the group.
+    box = group_box(metrics, records)
+    baseline = y + box.ascent
+    for item in box.items:
+        if item[0] == "text":
+            _, dx, dy, text, size, italic = item
+            canvas.create_text(x + dx, baseline + dy - metrics.ascent(size), text=text, anchor="nw",
+                               font=metrics.font(size, italic), tags=tags)
+        else:
+            _, x0, y0, x1, y1, width = item
+            canvas.create_line(x + x0, baseline + y0, x + x1, baseline + y1, width=width, tags=tags)
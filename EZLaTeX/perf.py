@@ -0,0 +1,108 @@
+import json
+import platform
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Upper bounds (ms) of the histogram buckets; the last bucket is open-ended.
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+RECENT = 120  # samples per span (or value) kept for the rolling figures in the HUD
+
+
+class SpanStats:
+    __slots__ = ("count", "total", "max", "buckets", "recent")
+
+    def __init__(self):
+        self.count, self.total, self.max = 0, 0.0, 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.recent = deque(maxlen=RECENT)
+
+    def add(self, ms):
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.recent.append(ms)
+
+    def rolling(self):
+        # (mean, p95) of the recent samples in ms, or None before the first one.
+        if not self.recent:
+            return None
+        samples = sorted(self.recent)
+        return sum(samples) / len(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def to_dict(self):
+        return {"count": self.count, "total_ms": self.total, "max_ms": self.max,
+                "mean_ms": self.total / self.count if self.count else 0.0,
+                "buckets_ms": list(BUCKETS_MS) + ["inf"], "histogram": list(self.buckets)}
+
+
+# Timing spans and counters for the editor's hot paths. Spans are recorded
+# from the Tk thread and from preview/compile workers alike, hence the lock.
+#
+#     with PERF.span("drag"):
+#         ...
+#     PERF.count("tk_calls")
+#     PERF.sample("tk_per_drag", calls / events)
+class PerfMonitor:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spans = defaultdict(SpanStats)
+        self.counters = defaultdict(int)
+        self.samples = defaultdict(lambda: deque(maxlen=RECENT))  # name -> recent values that are not times
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name, ms):
+        with self.lock:
+            self.spans[name].add(ms)
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def sample(self, name, value):
+        with self.lock:
+            self.samples[name].append(value)
+
+    def mean(self, name):
+        # Mean of the recent samples, or None before the first one.
+        with self.lock:
+            values = self.samples.get(name)
+            return sum(values) / len(values) if values else None
+
+    def rolling(self, name):
+        with self.lock:
+            stats = self.spans.get(name)
+            return stats.rolling() if stats is not None else None
+
+    def reset(self):
+        with self.lock:
+            self.spans.clear()
+            self.counters.clear()
+            self.samples.clear()
+
+    def snapshot(self, **gauges):
+        with self.lock:
+            return {"python": platform.python_version(), "platform": platform.platform(),
+                    "spans": {name: stats.to_dict() for name, stats in self.spans.items()},
+                    "counters": dict(self.counters),
+                    "samples": {name: list(values) for name, values in self.samples.items()}, "gauges": gauges}
+
+    def export(self, path, **gauges):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(**gauges), f, indent=2)
+
+
+PERF = PerfMonitor()
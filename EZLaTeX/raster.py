@@ -0,0 +1,43 @@
+import io
+import subprocess
+
+from perf import PERF
+
+
+def pdftoppm_args(width, dpi, draft):
+    args = ["pdftoppm", "-f", "1", "-l", "1", "-singlefile"]
+    if width is not None:
+        # Render straight at the target width instead of 200 dpi and shrinking.
+        args += ["-scale-to-x", str(width), "-scale-to-y", "-1"]
+    else:
+        args += ["-r", str(dpi)]
+    if draft:
+        args += ["-gray", "-aa", "no", "-aaVector", "no"]
+    return args
+
+
+def rasterize(pdf, width=None, dpi=72, draft=False):
+    with PERF.span("rasterize"):
+        return _rasterize(pdf, width, dpi, draft)
+
+
+def _rasterize(pdf, width, dpi, draft):
+    # Renders page 1 of the PDF bytes to a PIL image. The PDF goes to pdftoppm
+    # on stdin and the PPM/PGM comes back on stdout, so nothing touches disk.
+    # Draft mode renders grayscale without anti-aliasing, which is noticeably
+    # faster for quick iteration.
+    try:
+        result = subprocess.run(pdftoppm_args(width, dpi, draft) + ["-"], input=pdf,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        result = None
+    if result is not None and result.returncode == 0 and result.stdout:
+        from PIL import Image  # deferred: not needed until the first preview
+        img = Image.open(io.BytesIO(result.stdout))
+        img.load()
+        return img
+    # pdftoppm not on PATH (pdf2image may still know where poppler lives) or
+    # too old to read stdin: let pdf2image do the same work.
+    from pdf2image import convert_from_bytes
+    size = (width, None) if width is not None else None
+    return convert_from_bytes(pdf, dpi=dpi, size=size, first_page=1, last_page=1, grayscale=draft)[0]
@@ -0,0 +1,136 @@
+import json
+import os
+import uuid
+from operator import attrgetter
+
+from model import RECORD_TYPES
+
+# Document file format, version 2 (.eztex): JSON lines, written and read one
+# record at a time.
+#
+#     {"format":"eztex","version":2,"fields":{"exponent":["x","y","w","h","font_size","base","exponent"],...}}
+#     ["exponent",120,40,52,31,10,"x","2"]
+#     ["operation",172,40,30,31,10,"log","2","y","i=1","n"]
+#
+# The header names the columns of each record type, so files stay readable when
+# a type gains fields. Version 1 files (a single {"blocks": [{...}, ...]} object,
+# as earlier releases wrote with indent=4) are still read.
+FORMAT = "eztex"
+VERSION = 2
+EXTENSION = ".eztex"
+READ_CHUNK = 1024  # record lines parsed per json.loads call
+
+encode_json = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+class FormatError(ValueError):
+    pass
+
+
+def header():
+    return {"format": FORMAT, "version": VERSION,
+            "fields": {kind: list(cls.columns()) for kind, cls in RECORD_TYPES.items()}}
+
+
+_getters = {kind: attrgetter(*cls.columns()) for kind, cls in RECORD_TYPES.items()}
+
+
+def record_row(record):
+    return [record.kind, *_getters[record.kind](record)]
+
+
+class RecordWriter:
+    # Streams records to a text file opened with encoding="utf-8".
+    def __init__(self, f):
+        self.f = f
+        f.write(encode_json(header()) + "\n")
+
+    def write(self, record):
+        self.f.write(encode_json(record_row(record)) + "\n")
+
+
+def write_records(f, records):
+    writer = RecordWriter(f)
+    for record in records:
+        writer.write(record)
+
+
+def save_records(path, records):
+    # Written under a temporary name and renamed, so a failed save never
+    # truncates the previous file.
+    tmp = os.path.join(os.path.dirname(os.path.abspath(path)), f".{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+            write_records(f, records)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _decoder(cls, names):
+    if tuple(names) == cls.columns():
+        count = len(names)
+        fallback = lambda values: cls(**dict(zip(names, values)))
+        return lambda values: cls.from_columns(values) if len(values) == count else fallback(values)
+    # Written by another version: keep the columns this one knows, by name.
+    known = set(cls.columns())
+    picks = [(i, name) for i, name in enumerate(names) if name in known]
+    return lambda values: cls(**{name: values[i] for i, name in picks if i < len(values)})
+
+
+def record_decoders(fields):
+    # fields: the header's kind -> column names; returns kind -> decode(values).
+    return {kind: _decoder(RECORD_TYPES[kind], names) for kind, names in fields.items() if kind in RECORD_TYPES}
+
+
+def _chunks(f):
+    # Record lines are parsed a chunk at a time: one json.loads over many
+    # lines is much cheaper than one per line.
+    chunk = []
+    for line in f:
+        if line.strip():
+            chunk.append(line)
+            if len(chunk) == READ_CHUNK:
+                yield json.loads("[" + ",".join(chunk) + "]")
+                chunk = []
+    if chunk:
+        yield json.loads("[" + ",".join(chunk) + "]")
+
+
+def iter_records(f, sized=True):
+    # sized=False leaves w and h at 0 on records saved without them, for
+    # callers that measure blocks themselves (the editor, with Tk fonts).
+    first = f.readline()
+    try:
+        head = json.loads(first)
+    except ValueError:
+        head = None  # the "{" line of an indented version 1 file
+    if not isinstance(head, dict) or head.get("format") != FORMAT:
+        yield from _legacy_records(first + f.read(), sized)
+        return
+    if head.get("version", 0) > VERSION:
+        raise FormatError(f"Document format version {head['version']} is newer than this editor supports.")
+    decoders = record_decoders(head.get("fields", {}))
+    for rows in _chunks(f):
+        for values in rows:
+            decode = decoders.get(values[0])
+            if decode is not None:
+                yield decode(values[1:])
+
+
+def _legacy_records(text, sized=True):
+    for entry in json.loads(text)["blocks"]:
+        cls = RECORD_TYPES.get(entry.get("type"))
+        if cls is None:
+            continue
+        record = cls(**{name: entry[name] for name in cls.columns() if name in entry})
+        # Files saved before block sizes were recorded only have positions.
+        if sized and ("w" not in entry or "h" not in entry):
+            record.estimate_size()
+        yield record
+
+
+def load_records(path, sized=True):
+    with open(path, "r", encoding="utf-8") as f:
+        return list(iter_records(f, sized))
@@ -0,0 +1,109 @@
+from collections import defaultdict
+
+ROW_HEIGHT = 100  # height of the row buckets blocks_in() walks
+
+# Uniform grid over block edges. Every block is indexed twice: by its left edge
+# (x, y) and by its right edge (x + w, y). Snap and occupancy checks only ever
+# compare an edge against edges within a few pixels, so with cells at least as
+# large as the query radius a lookup touches a handful of cells no matter how
+# many blocks the document holds. Blocks are also bucketed by the row their
+# top edge falls in, for viewport-sized queries.
+class SpatialGrid:
+    def __init__(self, cell_w, cell_h):
+        self.cell_w, self.cell_h = cell_w, cell_h
+        self.left_edges = defaultdict(set)
+        self.right_edges = defaultdict(set)
+        self.rows = defaultdict(set)
+        self.bounds = {}  # block -> (x, y, w, h)
+        self.order = {}   # block -> insertion sequence, keeps scans deterministic
+        self._seq = 0
+
+    def _cell(self, x, y):
+        return int(x // self.cell_w), int(y // self.cell_h)
+
+    def insert(self, block, x, y, w, h):
+        if block in self.bounds:
+            self._unlink(block)
+        else:
+            self.order[block] = self._seq
+            self._seq += 1
+        self.bounds[block] = (x, y, w, h)
+        self.left_edges[self._cell(x, y)].add(block)
+        self.right_edges[self._cell(x + w, y)].add(block)
+        self.rows[int(y // ROW_HEIGHT)].add(block)
+
+    def remove(self, block):
+        if block in self.bounds:
+            self._unlink(block)
+            del self.bounds[block]
+            del self.order[block]
+
+    def clear(self):
+        self.left_edges.clear()
+        self.right_edges.clear()
+        self.rows.clear()
+        self.bounds.clear()
+        self.order.clear()
+
+    def _unlink(self, block):
+        x, y, w, _ = self.bounds[block]
+        for cells, key in ((self.left_edges, self._cell(x, y)), (self.right_edges, self._cell(x + w, y)),
+                           (self.rows, int(y // ROW_HEIGHT))):
+            bucket = cells.get(key)
+            if bucket is not None:
+                bucket.discard(block)
+                if not bucket:
+                    del cells[key]
+
+    def _near(self, cells, x, y, dx, dy, right):
+        cx0, cy0 = self._cell(x - dx, y - dy)
+        cx1, cy1 = self._cell(x + dx, y + dy)
+        found = []
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                for b in cells.get((cx, cy), ()):
+                    bx, by, bw, _ = self.bounds[b]
+                    ex = bx + bw if right else bx
+                    if abs(ex - x) < dx and abs(by - y) < dy:
+                        found.append(b)
+        return found
+
+    def near_left_edges(self, x, y, dx, dy):
+        # Blocks whose left edge lies strictly within (dx, dy) of (x, y).
+        return self._near(self.left_edges, x, y, dx, dy, right=False)
+
+    def near_right_edges(self, x, y, dx, dy):
+        # Blocks whose right edge lies strictly within (dx, dy) of (x, y).
+        return self._near(self.right_edges, x, y, dx, dy, right=True)
+
+    def blocks_in(self, x0, y0, x1, y1):
+        # Blocks with their left or right edge inside the rectangle. Only the
+        # rows it spans are walked, so a viewport query costs what is in and
+        # near the viewport, however long the document is.
+        found = set()
+        for row in range(int(y0 // ROW_HEIGHT), int(y1 // ROW_HEIGHT) + 1):
+            for block in self.rows.get(row, ()):
+                x, y, w, _ = self.bounds[block]
+                if y0 <= y <= y1 and (x0 <= x <= x1 or x0 <= x + w <= x1):
+                    found.add(block)
+        return found
+
+
+def find_snap(grid, block, x, y, w, snap_distance, vertical_threshold):
+    # Same rules as the original all-pairs scan in Block.on_drag: snap to the
+    # right of a neighbour, or to its left, unless another block already sits
+    # in that slot. Candidates are tried in the order they were added.
+    candidates = set(grid.near_right_edges(x, y, snap_distance, vertical_threshold))
+    candidates.update(grid.near_left_edges(x + w, y, snap_distance, vertical_threshold))
+    candidates.discard(block)
+    for other in sorted(candidates, key=grid.order.__getitem__):
+        ox, oy, ow, _ = grid.bounds[other]
+        if abs(x - (ox + ow)) < snap_distance and abs(y - oy) < vertical_threshold:
+            occupants = grid.near_left_edges(ox + ow, oy, 2, 2)
+            if not any(b is not block and b is not other for b in occupants):
+                return ox + ow, oy, other
+        elif abs((x + w) - ox) < snap_distance and abs(y - oy) < vertical_threshold:
+            occupants = grid.near_left_edges(ox - w, oy, 2, vertical_threshold)
+            if not any(b is not block and b is not other for b in occupants):
+                return ox - w, oy, other
+    return x, y, None
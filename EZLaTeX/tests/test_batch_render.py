@@ -0,0 +1,47 @@
+import json
+
+from batch_render import load_groups, main, output_paths
+from groups import build_groups
+from latex import group_latex
+from serializer import load_records
+
+
+def old_document(tmp_path):
+    # As the first releases saved it: positions only. The gaps are the real
+    # label widths, which estimate_size() gets wrong by more than SNAP_DISTANCE.
+    blocks = [{"type": "operation", "x": 100, "y": 50, "font_size": 10, "operation": "("},
+              {"type": "exponent", "x": 116, "y": 50, "font_size": 10, "base": "x", "exponent": "2"},
+              {"type": "operation", "x": 146, "y": 51, "font_size": 10, "operation": "+"},
+              {"type": "fraction", "x": 162, "y": 50, "font_size": 10, "numerator": "1", "denominator": "2"},
+              {"type": "operation", "x": 192, "y": 50, "font_size": 10, "operation": ")"},
+              {"type": "exponent", "x": 400, "y": 50, "font_size": 10, "base": "y", "exponent": "3"},
+              {"type": "operation", "x": 100, "y": 200, "font_size": 10, "operation": "∑"}]
+    path = tmp_path / "old.json"
+    path.write_text(json.dumps({"blocks": blocks}, indent=4), encoding="utf-8")
+    return path
+
+
+def test_old_document_groups_like_the_editor(tmp_path):
+    path = old_document(tmp_path)
+    # The plain estimates split the parenthesised chain.
+    assert len(build_groups(load_records(str(path)))) > 3
+    groups = load_groups(str(path))
+    assert sorted(len(g) for g in groups) == [1, 1, 5]
+    chain = next(g for g in groups if len(g) == 5)
+    latex = group_latex(chain)
+    assert latex.index(r"\left(") < latex.index(r"\right)")
+
+
+def test_renders_old_document(tmp_path, capsys):
+    path = old_document(tmp_path)
+    assert main([str(path), "-o", str(tmp_path / "out"), "-j", "1", "--engine", "stub"]) == 0
+    assert (tmp_path / "out" / "old.pdf").read_bytes().startswith(b"%PDF")
+
+
+def test_output_clashes(tmp_path):
+    documents = [str(tmp_path / "a" / "doc.eztex"), str(tmp_path / "b" / "doc.eztex"),
+                 str(tmp_path / "a" / "doc.json")]
+    targets, clashes = output_paths(documents, str(tmp_path / "out"))
+    assert sorted(out for _, out in targets) == [str(tmp_path / "out" / "a" / "doc.pdf"),
+                                                  str(tmp_path / "out" / "b" / "doc.pdf")]
+    assert [(path, other) for path, other, _ in clashes] == [(documents[2], documents[0])]
@@ -0,0 +1,39 @@
+import os
+
+from compile_cache import EVICT_TO, CompileCache
+from compiler import StubEngine
+
+
+def test_put_get_read(tmp_path):
+    cache = CompileCache(StubEngine(), str(tmp_path))
+    key = cache.key("x")
+    assert key != cache.key("y")
+    assert cache.get(key, ".pdf") is None and cache.read(key, ".pdf") is None
+    cache.put_bytes(key, ".pdf", b"%PDF")
+    assert cache.read(key, ".pdf") == b"%PDF"
+    assert cache.total == 4
+
+
+def test_read_after_eviction_is_a_miss(tmp_path):
+    cache = CompileCache(StubEngine(), str(tmp_path))
+    key = cache.key("x")
+    cache.put_bytes(key, ".pdf", b"%PDF")
+    os.remove(cache.get(key, ".pdf"))  # evicted by another writer
+    assert cache.read(key, ".pdf") is None
+
+
+def test_running_total_and_eviction(tmp_path):
+    cache = CompileCache(StubEngine(), str(tmp_path), max_bytes=1000)
+    for i in range(9):
+        path = cache.put_bytes(cache.key(str(i)), ".pdf", b"x" * 100)
+        os.utime(path, (i, i))  # oldest first
+    assert cache.total == 900
+    cache.put_bytes(cache.key("0"), ".pdf", b"x" * 50)  # replacing an entry
+    assert cache.total == 850
+    cache.put_bytes(cache.key("big"), ".pdf", b"x" * 300)
+    assert cache.total <= 1000 * EVICT_TO
+    assert cache.total == sum(p.stat().st_size for p in tmp_path.iterdir())
+    assert cache.read(cache.key("big"), ".pdf") is not None
+    assert cache.read(cache.key("1"), ".pdf") is None  # least recently used went first
+    # A new instance starts from what is on disk.
+    assert CompileCache(StubEngine(), str(tmp_path), max_bytes=1000).total == cache.total
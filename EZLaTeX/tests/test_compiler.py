@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from compiler import (CompileCancelled, CompileError, CompileJob, CompileService, CompileTimeout, PdflatexEngine,
+                      StubEngine)
+
+
+def test_stub_compile_returns_pdf(tmp_path):
+    service = CompileService(StubEngine(delay=0), temp_root=str(tmp_path))
+    try:
+        assert service.compile("x").pdf.startswith(b"%PDF")
+    finally:
+        service.shutdown()
+
+
+def test_cancel_running_job(tmp_path):
+    service = CompileService(StubEngine(delay=10), timeout=30, temp_root=str(tmp_path))
+    job = CompileJob()
+    errors = []
+
+    def run():
+        try:
+            service.compile("x", job)
+        except CompileError as e:
+            errors.append(e)
+
+    worker = threading.Thread(target=run)
+    start = time.perf_counter()
+    worker.start()
+    time.sleep(0.05)
+    job.cancel()
+    worker.join(5)
+    assert not worker.is_alive()
+    assert time.perf_counter() - start < 5
+    assert len(errors) == 1 and isinstance(errors[0], CompileCancelled)
+
+
+def test_cancel_before_start(tmp_path):
+    service = CompileService(StubEngine(delay=0), temp_root=str(tmp_path))
+    job = CompileJob()
+    job.cancel()
+    with pytest.raises(CompileCancelled):
+        service.compile("x", job)
+
+
+def test_cancel_future(tmp_path):
+    service = CompileService(StubEngine(delay=10), max_workers=1, timeout=30, temp_root=str(tmp_path))
+    try:
+        running, queued = service.submit("a"), service.submit("b")
+        time.sleep(0.05)
+        service.cancel(queued)
+        service.cancel(running)
+        with pytest.raises(CompileCancelled):
+            running.result(5)
+        assert queued.cancelled() or isinstance(queued.exception(5), CompileCancelled)
+    finally:
+        service.shutdown()
+
+
+def test_timeout(tmp_path):
+    service = CompileService(StubEngine(delay=10), timeout=0.1, temp_root=str(tmp_path))
+    start = time.perf_counter()
+    with pytest.raises(CompileTimeout):
+        service.compile("x")
+    assert time.perf_counter() - start < 5
+
+
+def test_failure(tmp_path):
+    service = CompileService(StubEngine(delay=0, fail_marker="BAD"), temp_root=str(tmp_path))
+    with pytest.raises(CompileError) as info:
+        service.compile("x BAD")
+    assert not isinstance(info.value, (CompileCancelled, CompileTimeout))
+
+
+def test_scratch_directories_removed(tmp_path):
+    service = CompileService(StubEngine(delay=0, fail_marker="BAD"), temp_root=str(tmp_path))
+    service.compile("x")
+    with pytest.raises(CompileError):
+        service.compile("BAD")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_missing_tex_is_a_compile_error(tmp_path):
+    engine = PdflatexEngine(executable=str(tmp_path / "no-such-pdflatex"))
+    service = CompileService(engine, temp_root=str(tmp_path))
+    with pytest.raises(CompileError):
+        service.compile("x")
+    assert list(tmp_path.iterdir()) == []
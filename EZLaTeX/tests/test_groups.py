@@ -0,0 +1,104 @@
+import random
+
+from groups import SNAP_DISTANCE, VERTICAL_THRESHOLD, GroupTracker, build_groups
+from spatial import SpatialGrid
+
+
+class Box:
+    # Just the geometry the tracker and the grid look at.
+    def __init__(self, x, y, w, h):
+        self.x, self.y, self.w, self.h = x, y, w, h
+
+
+def layout(count, seed=0):
+    # Rows of groups of 2-6 boxes placed edge to edge, 40 px apart.
+    rng = random.Random(seed)
+    boxes, x, y = [], 20, 20
+    while len(boxes) < count:
+        for _ in range(min(rng.randint(2, 6), count - len(boxes))):
+            w = rng.randint(20, 80)
+            if x + w > 780:
+                x, y = 20, y + 40
+            boxes.append(Box(x, y, w, 30))
+            x += w
+        x += 40
+    return boxes
+
+
+def brute_force_groups(blocks):
+    # The pairwise flood fill get_groups ran before GroupTracker existed.
+    def adjacent(a, b):
+        return abs(a.y - b.y) < VERTICAL_THRESHOLD and (abs(a.x + a.w - b.x) < SNAP_DISTANCE
+                                                        or abs(b.x + b.w - a.x) < SNAP_DISTANCE)
+    groups, seen = [], set()
+    for b in blocks:
+        if b in seen:
+            continue
+        seen.add(b)
+        group, stack = [b], [b]
+        while stack:
+            cur = stack.pop()
+            for other in blocks:
+                if other not in seen and adjacent(cur, other):
+                    seen.add(other)
+                    stack.append(other)
+                    group.append(other)
+        groups.append(group)
+    return groups
+
+
+def partition(groups):
+    return {frozenset(id(b) for b in group) for group in groups}
+
+
+def tracked(blocks):
+    grid = SpatialGrid(2 * SNAP_DISTANCE, VERTICAL_THRESHOLD)
+    tracker = GroupTracker(grid, SNAP_DISTANCE, VERTICAL_THRESHOLD)
+    for b in blocks:
+        grid.insert(b, b.x, b.y, b.w, b.h)
+        tracker.update(b)
+    return grid, tracker
+
+
+def test_tracker_matches_brute_force():
+    boxes = layout(300, seed=3)
+    _, tracker = tracked(boxes)
+    assert partition(tracker.groups()) == partition(brute_force_groups(boxes))
+
+
+def test_build_groups_matches_brute_force():
+    boxes = layout(300, seed=4)
+    assert partition(build_groups(boxes)) == partition(brute_force_groups(boxes))
+
+
+def test_groups_sorted_by_x():
+    _, tracker = tracked(layout(100))
+    for group in tracker.groups():
+        assert [b.x for b in group] == sorted(b.x for b in group)
+
+
+def test_tracker_follows_moves_and_removals():
+    rng = random.Random(7)
+    live = layout(200, seed=5)
+    grid, tracker = tracked(live)
+    live = list(live)
+    for step in range(400):
+        b = rng.choice(live)
+        if step % 10 == 9:
+            # Removing from the middle of a row splits its group.
+            grid.remove(b)
+            tracker.remove(b)
+            live.remove(b)
+        else:
+            # Half the moves snap onto another box's right edge, so groups merge too.
+            other = rng.choice(live)
+            if rng.random() < 0.5 and other is not b:
+                b.x, b.y = other.x + other.w, other.y + rng.randint(-3, 3)
+            else:
+                b.x, b.y = rng.randint(0, 780), rng.randint(0, 800)
+            grid.insert(b, b.x, b.y, b.w, b.h)
+            tracker.update(b)
+        if step % 20 == 0:
+            assert partition(tracker.groups()) == partition(brute_force_groups(live))
+    assert partition(tracker.groups()) == partition(brute_force_groups(live))
+    assert set(tracker.group_ids) == set(live)
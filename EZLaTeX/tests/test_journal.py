@@ -0,0 +1,109 @@
+import os
+import threading
+
+from journal import Journal
+from model import ExponentRecord, FractionRecord, OperationRecord
+
+
+class Block:
+    # All the journal needs of a Block view.
+    def __init__(self, record):
+        self.record = record
+
+
+def sample_blocks(count):
+    return [Block([ExponentRecord(f"x_{i}", str(i), x=i, y=i), FractionRecord(str(i), "2", x=i),
+                   OperationRecord("log", log_argument=f"z_{i}", y=i)][i % 3]) for i in range(count)]
+
+
+def rows(records):
+    return [(r.kind, *(getattr(r, name) for name in r.columns())) for r in records]
+
+
+def test_replay(tmp_path):
+    blocks = sample_blocks(50)
+    journal = Journal(str(tmp_path))
+    journal.start(blocks, file="doc.eztex")
+    assert os.path.exists(journal.log_path)
+    assert not journal.pending()  # its own journal is not an orphan
+
+    blocks[0].record.x += 15
+    journal.touch(blocks[0])
+    gone = blocks.pop(3)
+    journal.touch(gone)
+    journal.removed(gone)
+    added = Block(ExponentRecord("q", "9", x=5, y=500))
+    blocks.append(added)
+    journal.touch(added)
+    journal.flush()
+    added.record.exponent = "10"
+    journal.touch(added)
+    journal.flush()
+    journal.close()
+
+    recovered = Journal(str(tmp_path))
+    assert recovered.pending()
+    records, file = recovered.recover()
+    assert file == "doc.eztex"
+    assert sorted(rows(records)) == sorted(rows([b.record for b in blocks]))
+
+
+def test_torn_last_line(tmp_path):
+    blocks = sample_blocks(10)
+    journal = Journal(str(tmp_path))
+    journal.start(blocks)
+    blocks[0].record.y = 300
+    journal.touch(blocks[0])
+    journal.flush()
+    journal.close()
+    with open(journal.log_path, "a", encoding="utf-8") as f:
+        f.write('["put",1,"exponent",')
+    recovered = Journal(str(tmp_path))
+    assert recovered.pending()
+    records, _ = recovered.recover()
+    assert sorted(rows(records)) == sorted(rows([b.record for b in blocks]))
+
+
+def test_finish_leaves_nothing_to_recover(tmp_path):
+    journal = Journal(str(tmp_path))
+    journal.start(sample_blocks(10))
+    journal.finish()
+    assert not Journal(str(tmp_path)).pending()
+    assert [p.suffix for p in tmp_path.iterdir()] == [".lock"]  # the second instance's
+
+
+def test_running_instances_keep_their_journals(tmp_path):
+    first, second = Journal(str(tmp_path)), Journal(str(tmp_path))
+    first.start(sample_blocks(10))
+    second.start([])
+    assert first.log_path != second.log_path
+    # Both are alive: a third instance has nothing to recover.
+    assert not Journal(str(tmp_path)).pending()
+    first.close()
+    third = Journal(str(tmp_path))
+    assert third.pending() and third.orphan[0] == first.name
+    assert len(third.recover()[0]) == 10
+    third.start([])
+    third.discard_orphan()
+    assert not os.path.exists(first.log_path)
+    assert os.path.exists(second.log_path)
+    # A fourth instance sees nothing while the other journals' owners run.
+    assert not Journal(str(tmp_path)).pending()
+
+
+def test_fsync_off_the_calling_thread(tmp_path, monkeypatch):
+    synced = threading.Event()
+    threads = []
+
+    def fsync(fd):
+        threads.append(threading.current_thread())
+        synced.set()
+    monkeypatch.setattr(os, "fsync", fsync)
+    journal = Journal(str(tmp_path))
+    block = Block(ExponentRecord())
+    journal.start([block])
+    journal.touch(block)
+    journal.flush()
+    assert synced.wait(5)
+    assert threading.current_thread() not in threads
+    journal.finish()
@@ -0,0 +1,86 @@
+import random
+
+from groups import build_groups
+from latex import EMPTY_PAGE, PAGE_BREAK, PAGE_HEIGHT, PictureCache, picture_latex, picture_pages
+from model import ExponentRecord, FractionRecord, NthRootRecord, OperationRecord
+
+
+def document(count, seed=0):
+    # Rows of snapped groups mixing every block type.
+    rng = random.Random(seed)
+    makers = [lambda i: ExponentRecord(f"x_{i}", str(i % 9 + 1)),
+              lambda i: FractionRecord(str(i), str(i + 1)),
+              lambda i: NthRootRecord(f"y_{i}", str(i % 5 + 2)),
+              lambda i: OperationRecord(rng.choice(["+", "=", "∑", "log"]), log_argument=f"z_{i}")]
+    records, x, y = [], 20, 20
+    while len(records) < count:
+        font_size = rng.choice([8, 10, 12, 14])
+        for _ in range(min(rng.randint(2, 6), count - len(records))):
+            r = rng.choice(makers)(len(records))
+            r.font_size = font_size
+            r.estimate_size()
+            if x + r.w > 780:
+                x, y = 20, y + 40
+            r.x, r.y = x, y
+            x += r.w
+            records.append(r)
+        x += 40
+    return records
+
+
+def test_cache_matches_picture_latex():
+    records = document(200, seed=2)
+    cache = PictureCache()
+    groups = build_groups(records)
+    assert cache.picture(groups) == picture_latex(groups)
+    # Again from the cache, then after a font change, a move and a content edit.
+    assert cache.picture(groups) == picture_latex(groups)
+    records[3].font_size = 24
+    records[150].x += 1
+    next(r for r in records if isinstance(r, ExponentRecord)).exponent = "7"
+    groups = build_groups(records)
+    assert cache.picture(groups) == picture_latex(groups)
+
+
+def test_unchanged_document_reuses_picture():
+    records = document(100)
+    cache = PictureCache()
+    first = cache.picture(build_groups(records))
+    assert cache.picture(build_groups(records)) is first
+
+
+def test_fragment_memo_follows_edits():
+    record = ExponentRecord("x", "2")
+    first = record.get_latex()
+    record.x, record.y = 50, 60  # layout only
+    assert record.get_latex() is first
+    record.exponent = "3"
+    assert record.get_latex() != first and "3" in record.get_latex()
+
+
+def multi_page_document():
+    records = document(200, seed=2)
+    for r in records[100:]:
+        r.y += 2 * PAGE_HEIGHT  # leaves page 1 empty
+    return records
+
+
+def test_pages():
+    groups = build_groups(multi_page_document())
+    pages = picture_pages(groups)
+    assert len(pages) == 3
+    assert pages[1] == EMPTY_PAGE
+    assert picture_latex(groups) == PAGE_BREAK.join(pages)
+    cache = PictureCache()
+    assert cache.pages(groups) == tuple(pages)
+
+
+def test_edit_changes_only_its_page():
+    records = multi_page_document()
+    cache = PictureCache()
+    before = cache.pages(build_groups(records))
+    next(r for r in records if isinstance(r, ExponentRecord)).exponent = "7"
+    after = cache.pages(build_groups(records))
+    assert after[0] != before[0]
+    assert after[1:] == before[1:]
+    assert after[2] is before[2]
@@ -0,0 +1,51 @@
+import json
+
+from model import ExponentRecord, FractionRecord, NthRootRecord, OperationRecord
+from serializer import load_records, save_records
+
+
+def records(count):
+    makers = [lambda i: ExponentRecord(f"x_{i}", str(i), font_size=12, x=i, y=2 * i, w=40, h=30),
+              lambda i: FractionRecord(str(i), str(i + 1), x=i, y=i, w=30, h=50),
+              lambda i: NthRootRecord(f"y_{i}", "3", font_size=14, x=3 * i, y=i, w=45, h=31),
+              lambda i: OperationRecord("log", log_base=str(i % 7 + 2), log_argument=f"z_{i}", x=i, y=i, w=50, h=31)]
+    return [makers[i % len(makers)](i) for i in range(count)]
+
+
+def rows(records):
+    return [(r.kind, *(getattr(r, name) for name in r.columns())) for r in records]
+
+
+def test_round_trip(tmp_path):
+    saved = records(2500)  # more than one READ_CHUNK
+    saved.append(OperationRecord("∑", lower_limit="ünïcode \\alpha", upper_limit="n"))
+    path = tmp_path / "doc.eztex"
+    save_records(str(path), saved)
+    assert rows(load_records(str(path))) == rows(saved)
+    assert [p.name for p in tmp_path.iterdir()] == ["doc.eztex"]
+
+
+def test_unknown_columns_and_kinds(tmp_path):
+    # A file from a newer version: an extra column and a record type this one lacks.
+    path = tmp_path / "doc.eztex"
+    fields = {"exponent": ["x", "y", "w", "h", "font_size", "base", "exponent", "colour"],
+              "matrix": ["x", "y"]}
+    path.write_text("\n".join([json.dumps({"format": "eztex", "version": 2, "fields": fields}),
+                               json.dumps(["exponent", 1, 2, 3, 4, 12, "a", "b", "red"]),
+                               json.dumps(["matrix", 5, 6])]) + "\n", encoding="utf-8")
+    [record] = load_records(str(path))
+    assert rows([record]) == rows([ExponentRecord("a", "b", 12, x=1, y=2, w=3, h=4)])
+
+
+def test_legacy_json(tmp_path):
+    path = tmp_path / "doc.json"
+    path.write_text(json.dumps({"blocks": [
+        {"type": "exponent", "x": 10, "y": 20, "w": 40, "h": 30, "font_size": 12, "base": "x", "exponent": "3"},
+        {"type": "operation", "x": 50, "y": 20, "font_size": 12, "operation": "+"},
+        {"type": "unknown", "x": 0, "y": 0}]}, indent=4), encoding="utf-8")
+    exponent, operation = load_records(str(path))
+    assert (exponent.x, exponent.y, exponent.w, exponent.h, exponent.exponent) == (10, 20, 40, 30, "3")
+    assert operation.operation == "+" and operation.w > 0 and operation.h > 0
+    # The editor measures unsized blocks itself.
+    _, unsized = load_records(str(path), sized=False)
+    assert (unsized.w, unsized.h) == (0, 0)
@@ -0,0 +1,37 @@
+import random
+
+from spatial import SpatialGrid
+
+
+class Box:
+    def __init__(self, x, y, w, h):
+        self.x, self.y, self.w, self.h = x, y, w, h
+
+
+def test_blocks_in_matches_brute_force():
+    rng = random.Random(1)
+    grid = SpatialGrid(10, 10)
+    boxes = [Box(rng.randint(0, 780), rng.randint(-50, 20000), rng.randint(10, 80), 30) for _ in range(3000)]
+    for b in boxes:
+        grid.insert(b, b.x, b.y, b.w, b.h)
+    for b in boxes[::3]:  # moved, so they change rows
+        b.y = rng.randint(0, 20000)
+        grid.insert(b, b.x, b.y, b.w, b.h)
+    for b in boxes[1::7]:
+        grid.remove(b)
+    live = [b for i, b in enumerate(boxes) if i % 7 != 1]
+    for _ in range(50):
+        x0, y0 = rng.randint(-300, 700), rng.randint(-300, 19000)
+        x1, y1 = x0 + rng.randint(0, 1100), y0 + rng.randint(0, 1500)
+        expected = {b for b in live if y0 <= b.y <= y1 and (x0 <= b.x <= x1 or x0 <= b.x + b.w <= x1)}
+        assert grid.blocks_in(x0, y0, x1, y1) == expected
+
+
+def test_near_edges():
+    grid = SpatialGrid(10, 10)
+    a, b = Box(0, 0, 50, 30), Box(52, 3, 40, 30)
+    for box in (a, b):
+        grid.insert(box, box.x, box.y, box.w, box.h)
+    assert grid.near_left_edges(50, 0, 5, 10) == [b]
+    assert grid.near_right_edges(52, 3, 5, 10) == [a]
+    assert grid.near_left_edges(50, 20, 5, 10) == []